@@ -8,28 +8,18 @@ python3 mled_terminal.py
 
 import sys
 import time
-import unicodedata
+import queue
+import logging
+import concurrent.futures
 from typing import Optional, Callable
 import tkinter as tk
-from tkinter import ttk, messagebox
-import serial
-import serial.tools.list_ports
+from tkinter import ttk, messagebox, filedialog
 
-STX = 0x02
-LF  = 0x0A
-
-BAUDRATE = 9600
-BYTESIZE = serial.EIGHTBITS
-PARITY   = serial.PARITY_NONE
-STOPBITS = serial.STOPBITS_ONE
-
-LINE_CHOICES = [str(i) for i in range(1, 16)]
-
-COLOR_MAP = {
-    "Default": None,
-    "Red": 1, "Green": 2, "Blue": 3, "Yellow": 4, "Magenta": 5,
-    "Cyan": 6, "White": 7, "Orange": 8, "Deep pink": 9, "Light Blue": 10,
-}
+from mled_core import log, LINE_CHOICES, COLOR_MAP, CAP_DEVICE_SCROLL, FrameTrace, markup_overhead
+from mled_engine import DisplayEngine
+from mled_sequence import coursewalk
+from mled_capture import CaptureWriter
+from mled_ports import PortScanner
 
 # intensywne kolory przycisków
 GREEN_BG = "#22c55e"; GREEN_HOVER = "#16a34a"; GREEN_ACTIVE = "#15803d"
@@ -38,7 +28,14 @@ BLUE_BG  = "#3b82f6"; BLUE_HOVER  = "#2563eb"; BLUE_ACTIVE  = "#1d4ed8"
 GRAY_BG  = "#9ca3af"; GRAY_HOVER  = "#a8afb7"; GRAY_ACTIVE  = "#cbd5e1"
 
 # ---------- Rounded button ----------
+# rozmiar tekstu per (font, text), mierzony raz na cały program
+_TEXT_SIZE: "dict[tuple, tuple[int, int]]" = {}
+
 class RoundButton(tk.Canvas):
+    # The pill (two rectangles, four ovals) and the label are created once.
+    # Hover/press only itemconfigure the fill; a resize moves the items with
+    # coords(), and <Configure> bursts from stretch_fraction are coalesced
+    # into one layout pass.
     def __init__(self, master, text: str, command: Optional[Callable] = None,
                  bg=BLUE_BG, fg="#000000", hover=BLUE_HOVER, active=BLUE_ACTIVE,
                  padding_x=18, padding_y=10, radius=14, font=("Helvetica", 13, "bold"),
@@ -54,6 +51,9 @@ class RoundButton(tk.Canvas):
         self._command = command
         self._font = font
         self._force_width: Optional[int] = None
+        self._fill = bg
+        self._size = (0, 0)
+        self._resize_job = None
 
         if ambient is None:
             try:
@@ -63,60 +63,87 @@ class RoundButton(tk.Canvas):
 
         super().__init__(master, highlightthickness=0, bg=ambient, bd=0, **kwargs)
         self._enabled = True
-        self._draw(self._bg_color)
-        self.bind("<Enter>", lambda e: self._redraw(self._hover))
-        self.bind("<Leave>", lambda e: self._redraw(self._bg_color))
-        self.bind("<ButtonPress-1>", lambda e: self._redraw(self._active))
+        for _ in range(2):
+            self.create_rectangle(0, 0, 0, 0, fill=bg, outline="", tags="body")
+        for _ in range(4):
+            self.create_oval(0, 0, 0, 0, fill=bg, outline="", tags="body")
+        self._label = self.create_text(0, 0, text=text, fill=fg, font=font, anchor="c")
+        self._layout()
+        self.bind("<Enter>", lambda e: self._set_fill(self._hover))
+        self.bind("<Leave>", lambda e: self._set_fill(self._bg_color))
+        self.bind("<ButtonPress-1>", lambda e: self._set_fill(self._active))
         self.bind("<ButtonRelease-1>", self._on_release)
 
-    def _pill(self, w, h, r, fill):
-        self.create_rectangle(r, 0, w - r, h, fill=fill, outline="")
-        self.create_rectangle(0, r, w, h - r, fill=fill, outline="")
-        self.create_oval(0, 0, 2 * r, 2 * r, fill=fill, outline="")
-        self.create_oval(w - 2 * r, 0, w, 2 * r, fill=fill, outline="")
-        self.create_oval(0, h - 2 * r, 2 * r, h, fill=fill, outline="")
-        self.create_oval(w - 2 * r, h - 2 * r, w, h, fill=fill, outline="")
-
-    def _draw(self, fill):
-        self.delete("all")
-        tmp = self.create_text(0, 0, text=self._text, fill=self._fg_color, font=self._font, anchor="nw")
-        bbox = self.bbox(tmp)
-        w_text = (bbox[2] - bbox[0]) + 2 * self._padx
-        h = (bbox[3] - bbox[1]) + 2 * self._pady
-        self.delete(tmp)
+    def _text_size(self) -> "tuple[int, int]":
+        key = (self._font, self._text)
+        size = _TEXT_SIZE.get(key)
+        if size is None:
+            x0, y0, x1, y1 = self.bbox(self._label)
+            size = _TEXT_SIZE[key] = (x1 - x0, y1 - y0)
+        return size
+
+    def _layout(self):
+        tw, th = self._text_size()
+        w_text = tw + 2 * self._padx
+        h = th + 2 * self._pady
         w = max(w_text, self._force_width or 0) or w_text
+        if (w, h) == self._size:
+            return
+        self._size = (w, h)
         self.config(width=w, height=h)
         r = min(self._radius, h // 2, w // 2)
-        self._pill(w, h, r, fill)
-        self.create_text(w // 2, h // 2, text=self._text, fill=self._fg_color, font=self._font, anchor="c")
-
-    def _redraw(self, fill):
-        self._draw(fill)
+        rect1, rect2, o1, o2, o3, o4 = self.find_withtag("body")
+        self.coords(rect1, r, 0, w - r, h)
+        self.coords(rect2, 0, r, w, h - r)
+        self.coords(o1, 0, 0, 2 * r, 2 * r)
+        self.coords(o2, w - 2 * r, 0, w, 2 * r)
+        self.coords(o3, 0, h - 2 * r, 2 * r, h)
+        self.coords(o4, w - 2 * r, h - 2 * r, w, h)
+        self.coords(self._label, w // 2, h // 2)
+
+    def _set_fill(self, fill):
+        if fill == self._fill:
+            return
+        self._fill = fill
+        self.itemconfigure("body", fill=fill)
 
     def _on_release(self, _):
         if not self._enabled:
             return
-        self._redraw(self._hover)
+        self._set_fill(self._hover)
         if callable(self._command):
             self.after(1, self._command)
 
+    def set_text(self, text: str):
+        if text == self._text:
+            return
+        self._text = text
+        self.itemconfigure(self._label, text=text)
+        self._layout()
+
     def set_enabled(self, enabled: bool):
         self._enabled = enabled
         self._fg_color = "#9ca3af" if not enabled else "#000000"
-        self._draw(self._bg_color)
+        self.itemconfigure(self._label, fill=self._fg_color)
+        self._set_fill(self._bg_color)
 
     def stretch_fraction(self, parent, frac: float = 1.0):
         def on_conf(e):
             self._force_width = int(e.width * frac)
-            self._draw(self._bg_color)
+            if self._resize_job is None:
+                self._resize_job = self.after_idle(self._apply_resize)
         parent.bind("<Configure>", on_conf)
 
+    def _apply_resize(self):
+        self._resize_job = None
+        self._layout()
+
 # ---------- App ----------
 class MLEDTerminal(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("MLED RS232 Terminal")
-        self.geometry("1100x840")
+        self.geometry("1100x890")
         self.resizable(False, False)
 
         self.bg = "#242424"
@@ -125,35 +152,59 @@ class MLEDTerminal(tk.Tk):
         self.subfg = "#cbd5e1"
         self.configure(bg=self.bg)
 
-        self.port = None
+        # scroll, timery i porty obsługuje silnik w swoim wątku, GUI tylko wywołuje jego API
+        self.engine = DisplayEngine()
+        self.engine.start_background()
+        # lista portów odświeżana w tle; okno wyboru czyta tylko cache
+        self.scanner = PortScanner(exclude=lambda: list(self.engine.pool.links))
+        self.scanner.start()
+        self.port_list: Optional[tk.Listbox] = None
+        self.port_devices: "list[str]" = []
+        self.target_vars: "dict[str, tk.BooleanVar]" = {}
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # pasek statusu
         self.conn_bar = tk.Frame(self, height=22, bg="#5b5b5b")
         self.conn_bar.pack(fill=tk.X, side=tk.TOP)
         self.conn_label = tk.Label(self.conn_bar, text="Disconnected", fg="white", bg="#5b5b5b", font=("Helvetica", 12, "bold"))
         self.conn_label.pack(side=tk.LEFT, padx=10, pady=2)
+        self.link_label = tk.Label(self.conn_bar, text="", fg="white", bg="#5b5b5b", font=("Helvetica", 11))
+        self.link_label.pack(side=tk.RIGHT, padx=10, pady=2)
+        self.metrics_toggle = tk.Label(self.conn_bar, text="Metrics ▸", fg="white", bg="#5b5b5b",
+                                       font=("Helvetica", 11), cursor="hand2")
+        self.metrics_toggle.pack(side=tk.RIGHT, padx=(10, 0), pady=2)
+        self.metrics_toggle.bind("<Button-1>", lambda e: self.toggle_metrics())
+
+        # panel metryk pod paskiem statusu, domyślnie zwinięty
+        self.metrics_bar = tk.Frame(self, bg="#1b1b1b")
+        self.metrics_label = tk.Label(self.metrics_bar, text="", fg=self.subfg, bg="#1b1b1b", font=("Courier", 11))
+        self.metrics_label.pack(side=tk.LEFT, padx=10, pady=2)
+        RoundButton(self.metrics_bar, text="Export trace", command=self.export_trace,
+                    bg=GRAY_BG, hover=GRAY_HOVER, active=GRAY_ACTIVE, fg="#000000",
+                    padding_x=10, padding_y=2, radius=8, font=("Helvetica", 10, "bold"),
+                    ambient="#1b1b1b").pack(side=tk.RIGHT, padx=(6, 10), pady=2)
+        self.btn_record = RoundButton(self.metrics_bar, text="Record…", command=self.toggle_capture,
+                                      bg=GRAY_BG, hover=GRAY_HOVER, active=GRAY_ACTIVE, fg="#000000",
+                                      padding_x=10, padding_y=2, radius=8, font=("Helvetica", 10, "bold"),
+                                      ambient="#1b1b1b")
+        self.btn_record.pack(side=tk.RIGHT, padx=6, pady=2)
+        self.capture: Optional[CaptureWriter] = None
+        self.trace_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.metrics_bar, text="Trace", variable=self.trace_var, onvalue=True, offvalue=False,
+                       command=self.on_toggle_trace, bg="#1b1b1b", fg=self.subfg, activebackground="#1b1b1b",
+                       activeforeground=self.fg, selectcolor="#1b1b1b", highlightthickness=0, bd=0
+                       ).pack(side=tk.RIGHT, padx=6)
+        self.metrics_visible = False
+        self.trace: Optional[FrameTrace] = None
+        self.metrics_prev = (time.monotonic(), {})
 
         # stany
-        self.scroll_job = None
-        self.scroll_buf = ""
-        self.scroll_delay_ms = 300
-        self.scroll_temp_prev = None
-        self.scroll_len = 0
-        self.scroll_idx = 0
-        self.scroll_active_color: Optional[int] = None
-        self.scroll_rainbow = False
-
-        self.timer_mode = None
-        self.timer_start_ts = None
-        self.timer_down_end_ts = None
-        self.timer_job = None
-
         self.lock_mode: Optional[str] = None
+        # blokada osobno dla każdej linii; lock_mode = blokada wybranej linii
+        self.line_modes: "dict[str, str]" = {}
 
         # rainbow
         self.rainbow_var = tk.BooleanVar(value=False)
-        self.rainbow_codes = [1,2,3,4,5,6,7,8,9,10]
-        self.rainbow_idx = 0
 
         # style ttk
         style = ttk.Style()
@@ -170,6 +221,8 @@ class MLEDTerminal(tk.Tk):
 
         self.build_ui()
         self.set_mode(None)
+        self.sync_engine()
+        self.poll_engine()
 
     # -------- combobox dark ----------
     def style_dark_combobox(self, combo: ttk.Combobox, field_bg: str = "#111111"):
@@ -188,225 +241,263 @@ class MLEDTerminal(tk.Tk):
 
     # ---------- serial ----------
     def open_serial(self):
-        port_name = self.port_var.get().strip()
-        if not port_name:
+        # kilka tablic: nazwy portów po przecinku
+        port_names = [p.strip() for p in self.port_var.get().split(",") if p.strip()]
+        if not port_names:
             messagebox.showerror("Error", "Provide serial port name")
             return
-        try:
-            self.port = serial.Serial(port=port_name, baudrate=BAUDRATE, bytesize=BYTESIZE,
-                                      parity=PARITY, stopbits=STOPBITS, timeout=0.2)
-            self.btn_connect.set_enabled(False)
-            self.btn_disconnect.set_enabled(True)
-            self.set_connected_ui(True, port_name)
-            payload = "^ic 5 7^^cs 3^MLED^cs 0^"
-            self.send_bytes(self.build_frame(self.line_var.get(), self.brightness_var.get(), payload))
-            self.after(3000, lambda: self.send_bytes(self.build_frame(self.line_var.get(), self.brightness_var.get(), "")))
-        except Exception as e:
-            self.port = None
-            ports = [p.device for p in serial.tools.list_ports.comports()]
+        failed = self.engine.call(self.engine.open(port_names)).result()
+        if failed:
+            ports = [p.label() for p in self.scanner.ranked()]
             info = "\nAvailable ports:\n" + ("\n".join(ports) if ports else "none")
-            messagebox.showerror("Error", f"Could not open port.\n{e}{info}")
+            messagebox.showerror("Error", "Could not open port.\n" + "\n".join(f"{n}: {e}" for n, e in failed) + info)
+        if not self.engine.connected:
             self.set_connected_ui(False)
+            return
+        self.scanner.mark_used(self.engine.pool.links)
+        self.btn_connect.set_enabled(False)
+        self.btn_disconnect.set_enabled(True)
+        self.set_connected_ui(True, ", ".join(self.engine.pool.links))
+        self.build_target_toggles()
+        self.sync_engine()
+        self.sync_device_scroll()
+        self.engine.call(self.engine.hello())
 
     def close_serial(self):
         try:
-            if self.port and self.port.is_open:
-                self.port.close()
-            self.port = None
+            self.engine.call(self.engine.close()).result()
             self.btn_connect.set_enabled(True)
             self.btn_disconnect.set_enabled(False)
             self.set_connected_ui(False)
+            self.build_target_toggles()
         except Exception as e:
             messagebox.showerror("Error", f"Close port problem.\n{e}")
 
+    def on_close(self):
+        self.scanner.stop()
+        try:
+            self.engine.stop_background()
+        except concurrent.futures.TimeoutError:
+            # zawieszony port albo pętla: okno i tak się zamyka
+            log.warning("engine did not stop in time, closing anyway")
+        if self.capture is not None:
+            self.capture.close()
+        self.destroy()
+
+    def build_target_toggles(self):
+        # przy więcej niż jednej tablicy wybór, do których idą ramki
+        for child in self.targets_row.winfo_children():
+            child.destroy()
+        self.target_vars = {}
+        if len(self.engine.pool) < 2:
+            return
+        for name in self.engine.pool.links:
+            var = self.target_vars[name] = tk.BooleanVar(value=True)
+            tk.Checkbutton(self.targets_row, text=name, variable=var, onvalue=True, offvalue=False,
+                           command=self.sync_engine,
+                           bg=self.bg, fg=self.fg, activebackground=self.bg, activeforeground=self.fg,
+                           selectcolor=self.bg, highlightthickness=0, bd=0).pack(side=tk.LEFT, padx=(0,8))
+
+    def selected_targets(self) -> Optional["list[str]"]:
+        if not self.target_vars:
+            return None
+        return [name for name, var in self.target_vars.items() if var.get()]
+
+    def sync_engine(self, *_):
+        # linia, jasność, kolor i tablice z GUI -> silnik
+        self.engine.call_soon(self.engine.configure, self.line_var.get(), self.brightness_var.get(),
+                              COLOR_MAP.get(self.text_color_var.get()), self.selected_targets())
+
+    def sync_device_scroll(self):
+        self.engine.call_soon(self.engine.pool.set_cap, CAP_DEVICE_SCROLL,
+                              bool(self.device_scroll_var.get()), self.selected_targets())
+
+    def require_connection(self) -> bool:
+        if not self.engine.connected:
+            messagebox.showwarning("Warning", "Not connected")
+            return False
+        return True
+
     def set_connected_ui(self, connected: bool, port_name: str = ""):
         if connected:
             self.conn_bar.configure(bg="#22c55e")
             self.conn_label.configure(text=f"Connected to: {port_name}", bg="#22c55e", fg="#062b14")
+            self.link_label.configure(bg="#22c55e", fg="#062b14")
+            self.metrics_toggle.configure(bg="#22c55e", fg="#062b14")
         else:
             self.conn_bar.configure(bg="#5b5b5b")
             self.conn_label.configure(text="Disconnected", bg="#5b5b5b", fg="white")
+            self.link_label.configure(text="", bg="#5b5b5b", fg="white")
+            self.metrics_toggle.configure(bg="#5b5b5b", fg="white")
+
+    def poll_engine(self):
+        # zdarzenia silnika i błędy zapisu z wątków writerów, jeden komunikat na porcję
+        while True:
+            try: kind, line = self.engine.events.get_nowait()
+            except queue.Empty: break
+            if kind == "idle" and line is None:
+                self.line_modes.clear()
+                self.set_mode(None)
+            elif kind == "idle":
+                self.set_mode(None, line)
+        links = list(self.engine.pool.links.items())
+        errors = []
+        for name, link in links:
+            err = None
+            while True:
+                try: err = link.writer.errors.get_nowait()
+                except queue.Empty: break
+            if err is not None:
+                errors.append(f"{name}: {err}")
+        watchdog = self.engine.watchdog
+        if watchdog is not None:
+            # watchdog sam otwiera port ponownie, więc bez okienek przy każdym błędzie
+            errors = []
+            while True:
+                try: kind, name, info = watchdog.events.get_nowait()
+                except queue.Empty: break
+                if kind == "lost":
+                    self.conn_label.configure(text=f"Reconnecting: {name} ({info})")
+                else:
+                    self.conn_label.configure(text=f"Connected to: {', '.join(self.engine.pool.links)}"
+                                                   f"  (back after {info:.0f} ms)")
+            down = set(watchdog.down)
+            self.conn_bar.configure(bg="#f59e0b" if down else "#22c55e")
+            for widget in (self.conn_label, self.link_label, self.metrics_toggle):
+                widget.configure(bg="#f59e0b" if down else "#22c55e")
+        else:
+            down = set()
+        # jeden odczyt pod blokadą puli: pasek łącza i metryki z tego samego stanu
+        snap = self.engine.pool.snapshot()
+        if links:
+            parts = []
+            for name, h in snap["health"].items():
+                state = " reconnecting" if name in down else "" if h["state"] == "ok" else f" {h['state']}"
+                parts.append(f"{name} {h['utilization'] * 100:.0f}%{state}")
+            self.link_label.configure(text="  ·  ".join(parts))
+        ms = self.engine.scroll_step_ms()
+        if ms is not None:
+            self.scroll_rate_var.set(f"{ms} ms/step · {1000.0 / ms:.1f} steps/s")
+        elif self.scroll_rate_var.get():
+            self.scroll_rate_var.set("")
+        changed = False
+        while True:
+            try: self.scanner.changes.get_nowait()
+            except queue.Empty: break
+            changed = True
+        if changed:
+            self.on_ports_changed()
+        if self.metrics_visible:
+            self.update_metrics(snap["counters"])
+        if errors:
+            messagebox.showerror("Error", "Write failed.\n" + "\n".join(errors))
+        self.after(250, self.poll_engine)
+
+    # ---------- metryki ----------
+    def toggle_metrics(self):
+        # okno ma stały rozmiar, więc rośnie o wysokość panelu
+        self.metrics_visible = not self.metrics_visible
+        w, h = self.winfo_width(), self.winfo_height()
+        if self.metrics_visible:
+            self.metrics_bar.pack(fill=tk.X, side=tk.TOP, after=self.conn_bar)
+            self.metrics_toggle.configure(text="Metrics ▾")
+            self.metrics_prev = (time.monotonic(), self.engine.pool.counters())
+            self.update_idletasks()
+            self.geometry(f"{w}x{h + self.metrics_bar.winfo_height()}")
+        else:
+            dh = self.metrics_bar.winfo_height()
+            self.metrics_bar.pack_forget()
+            self.metrics_toggle.configure(text="Metrics ▸")
+            self.geometry(f"{w}x{h - dh}")
+
+    def update_metrics(self, cur: dict):
+        now = time.monotonic()
+        t_prev, prev = self.metrics_prev
+        self.metrics_prev = (now, cur)
+        dt = max(1e-3, now - t_prev)
+        # po rozłączeniu liczniki startują od zera
+        fps = max(0, cur["frames"] - prev.get("frames", 0)) / dt
+        bps = max(0, cur["bytes"] - prev.get("bytes", 0)) / dt
+        text = (f"{fps:5.1f} frames/s  {bps:6.0f} B/s  p99 write {cur['p99_write_ms']:5.1f} ms  "
+                f"dropped {cur['dropped']}  suppressed {cur['suppressed']}")
+        if self.trace is not None:
+            text += f"  trace {len(self.trace)}/{self.trace.size}"
+        self.metrics_label.configure(text=text)
+
+    def on_toggle_trace(self):
+        # nowy ślad przy każdym włączeniu; po wyłączeniu zostaje do eksportu
+        if self.trace_var.get():
+            self.trace = FrameTrace()
+            self.engine.call_soon(self.engine.set_trace, self.trace)
+        else:
+            self.engine.call_soon(self.engine.set_trace, None)
 
-    def send_bytes(self, data: bytes):
-        if not self.port or not self.port.is_open:
-            messagebox.showwarning("Warning", "Not connected")
+    def export_trace(self):
+        if self.trace is None or not len(self.trace):
+            messagebox.showinfo("Trace", "No trace recorded. Enable Trace first.")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv")],
+                                            initialfile="mled-trace.csv")
+        if not path:
             return
         try:
-            self.port.write(data)
-        except Exception as e:
-            messagebox.showerror("Error", f"Write failed.\n{e}")
-
-    # ---------- frames ----------
-    def build_frame(self, line_char: str, brightness: str, payload: str) -> bytes:
-        if brightness not in ["1", "2", "3"]:
-            raise ValueError("Brightness must be 1 2 or 3")
-        if len(payload) > 64:
-            raise ValueError("Too long. Max 64 characters")
-        b = bytearray()
-        b.append(STX)
-        b.extend(line_char.encode("ascii"))
-        b.extend(brightness.encode("ascii"))
-        b.extend(payload.encode("latin-1"))
-        b.append(LF)
-        return bytes(b)
-
-    def wrap_color(self, text: str, color_code: Optional[int]) -> str:
-        return text if color_code is None else f"^cs {color_code}^{text}^cs 0^"
-
-    # transliteracja
-    def sanitize(self, text: str) -> str:
-        base_map = {
-            'ą':'a','ć':'c','ę':'e','ł':'l','ń':'n','ó':'o','ś':'s','ż':'z','ź':'z',
-            'Ą':'A','Ć':'C','Ę':'E','Ł':'L','Ń':'N','Ó':'O','Ś':'S','Ż':'Z','Ź':'Z',
-            'ß':'ss','Æ':'AE','æ':'ae','Œ':'OE','œ':'oe'
-        }
-        out = []
-        for ch in text:
-            if ch == '^':
-                out.append('*'); continue
-            ch = base_map.get(ch, ch)
-            deacc = ''.join(c for c in unicodedata.normalize('NFKD', ch) if not unicodedata.combining(c))
-            for c in deacc:
-                try:
-                    c.encode('latin-1')
-                    o = ord(c)
-                    if 32 <= o <= 126 or 224 <= o <= 255:
-                        out.append(c)
-                    else:
-                        out.append('*')
-                except Exception:
-                    out.append('*')
-        return ''.join(out)
-
-    def cmd_rt(self, flags: int, fmt_text: str) -> str:
-        return f"^rt {flags} {fmt_text}^"
-
-    # ---------- scrolling ----------
-    def start_scroll(self, text: str, color_override: Optional[int] = None, rainbow_cycle: bool = False):
-        self.stop_scroll()
-        text = self.sanitize(text)
-        base = text if len(text) <= 64 else text[:64]
-        self.scroll_buf = base + "   "
-        speed = int(self.scroll_speed_var.get())
-        delay_map = {1: 550, 2: 350, 3: 220}
-        self.scroll_delay_ms = delay_map.get(speed, 550)
-        self.scroll_active_color = color_override
-        self.scroll_len = len(self.scroll_buf)
-        self.scroll_idx = 0
-        self.scroll_rainbow = bool(rainbow_cycle)
-        if speed == 0:
-            self._send_plain(base, color_override); return
-        self.scroll_step()
-
-    def scroll_step(self):
-        if not self.scroll_buf:
+            n = self.trace.export(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Export failed.\n{e}")
+            return
+        messagebox.showinfo("Trace", f"{n} records written to\n{path}")
+
+    def toggle_capture(self):
+        # zapis wszystkich wysłanych ramek do pliku (mled_capture.py info/replay)
+        if self.capture is not None:
+            capture, self.capture = self.capture, None
+            self.btn_record.set_enabled(False)
+            self.finish_capture(self.engine.call(self.engine.detach_capture()), capture)
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".mledcap", filetypes=[("MLED capture", "*.mledcap")],
+                                            initialfile="mled-session.mledcap")
+        if not path:
             return
-        self.scroll_buf = self.scroll_buf[1:] + self.scroll_buf[0]
-        self._send_plain(self.scroll_buf[:64], self.scroll_active_color)
-        self.scroll_idx = (self.scroll_idx + 1) % max(1, self.scroll_len)
-        if self.scroll_rainbow and self.scroll_idx == 0:
-            self.scroll_active_color = self.next_rainbow_color()
-        self.scroll_job = self.after(self.scroll_delay_ms, self.scroll_step)
-
-    def stop_scroll(self):
-        if self.scroll_job is not None:
-            try: self.after_cancel(self.scroll_job)
-            except Exception: pass
-            self.scroll_job = None
-        self.scroll_buf = ""
-        self.scroll_len = 0
-        self.scroll_idx = 0
-        self.scroll_active_color = None
-        self.scroll_rainbow = False
-
-    def _send_plain(self, text: str, color_override: Optional[int] = None):
-        code = color_override
-        if code is None:
-            code = COLOR_MAP.get(self.text_color_var.get())
-        s = self.sanitize(text)
-        payload = self.wrap_color(s, code)
         try:
-            frame = self.build_frame(self.line_var.get(), self.brightness_var.get(), payload)
-        except ValueError as e:
-            if "Too long" in str(e):
-                overhead = 0 if code is None else (len(f"^cs {code}^") + len("^cs 0^"))
-                allowed = max(0, 64 - overhead)
-                s2 = s[:allowed]
-                payload = self.wrap_color(s2, code)
-                frame = self.build_frame(self.line_var.get(), self.brightness_var.get(), payload)
-            else:
-                raise
-        self.send_bytes(frame)
-
-    # ---------- timer tick ----------
-    def stop_timer_job(self):
-        if self.timer_job is not None:
-            try: self.after_cancel(self.timer_job)
-            except Exception: pass
-            self.timer_job = None
-
-    def tick_timer_up(self):
-        if self.timer_mode != 'up' or self.timer_start_ts is None:
+            self.capture = CaptureWriter(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Cannot record.\n{e}")
             return
-        now = time.time()
-        elapsed = max(0.0, now - self.timer_start_ts)
-        mm = int(elapsed // 60)
-        ss_full = elapsed % 60
-        ss = int(ss_full)
-        cc = int((ss_full - ss) * 100)
-        txt = f"{ss:02d}.{cc:02d}" if mm == 0 else f"{mm:02d}:{ss:02d}.{cc:02d}"
-        payload = self.wrap_color(txt, COLOR_MAP[self.up_color_var.get()])
-        self.send_bytes(self.build_frame(self.line_var.get(), self.brightness_var.get(), payload))
-        self.timer_job = self.after(100, self.tick_timer_up)
-
-    # ---------- countdown finish ----------
-    def on_countdown_finished(self):
-        self.stop_timer_job()
-        msg = (self.down_finish_text_var.get() or "").strip()
-        if not msg:
+        self.engine.call_soon(self.engine.set_capture, self.capture)
+        self.btn_record.set_text("Stop rec")
+
+    def finish_capture(self, detached, capture: CaptureWriter):
+        # zamknięcie dopiero, gdy pętla silnika odpięła plik od PortPool.send
+        if not detached.done():
+            self.after(20, self.finish_capture, detached, capture)
             return
-        msg = self.sanitize(msg)[:30]
-        color_code = COLOR_MAP[self.down_color_var.get()]
-        show_secs = max(1, min(180, int(self.down_finish_secs_var.get() or 1)))
-        flash_on = bool(self.down_flash_var.get())
-
-        if len(msg) <= 8:
-            if flash_on:
-                # miganie fragmentu
-                if color_code is None:
-                    payload = f"^fs 0 1^" + msg + "^fe^"
-                else:
-                    payload = f"^fs 0 1 {color_code}^" + msg + "^fe^"
-            else:
-                payload = self.wrap_color(msg, color_code)
-            self.send_bytes(self.build_frame(self.line_var.get(), self.brightness_var.get(), payload))
-
-            def _clear():
-                self.timer_job = None
-                self.action_clear_line()
-            self.timer_job = self.after(show_secs * 1000, _clear)
-        else:
-            # dłuższy tekst -> auto scroll 1, opcjonalnie flash całej linii
-            if flash_on:
-                fd = f"^fd 0 1 {color_code}^" if color_code is not None else "^fd 0 1^"
-                self.send_bytes(self.build_frame(self.line_var.get(), self.brightness_var.get(), fd))
-            self.scroll_temp_prev = self.scroll_speed_var.get()
-            prev_text_color = self.text_color_var.get()
-            self.scroll_speed_var.set("1")
-            self.text_color_var.set(self.down_color_var.get())
-            self.start_scroll(msg, color_override=color_code, rainbow_cycle=False)
-
-            def _stop_scroll_and_clear():
-                self.timer_job = None
-                self.action_clear_line()
-                if self.scroll_temp_prev is not None:
-                    self.scroll_speed_var.set(self.scroll_temp_prev)
-                    self.scroll_temp_prev = None
-                self.text_color_var.set(prev_text_color)
-            self.timer_job = self.after(show_secs * 1000, _stop_scroll_and_clear)
+        capture.close()
+        self.btn_record.set_enabled(True)
+        self.btn_record.set_text("Record…")
+        messagebox.showinfo("Capture", f"{capture.frames} frames written to\n{capture.path}")
 
     # ---------- blokady ----------
-    def set_mode(self, mode: Optional[str]):
+    def set_mode(self, mode: Optional[str], line: Optional[str] = None):
+        line = line or self.line_var.get()
+        if mode == "cw":
+            # playlista jest jedna: nowa zwalnia linię poprzedniej
+            for other in [l for l, m in self.line_modes.items() if m == "cw"]:
+                del self.line_modes[other]
+        if mode is None:
+            self.line_modes.pop(line, None)
+        else:
+            self.line_modes[line] = mode
+        if "cw" not in self.line_modes.values():
+            self.cw_paused = False
+            self.btn_cw_pause.set_text("Pause")
+        if line == self.line_var.get():
+            self.show_mode(mode)
+
+    def on_line_changed(self, *_):
+        # inna linia: przyciski według tego, co na niej działa
+        self.show_mode(self.line_modes.get(self.line_var.get()))
+
+    def show_mode(self, mode: Optional[str]):
         self.lock_mode = mode
         text_enabled = (mode in (None, "text"))
         self.btn_send.set_enabled(text_enabled)
@@ -421,14 +512,12 @@ class MLEDTerminal(tk.Tk):
         down_enabled = (mode in (None, "down"))
         self.btn_down_start.set_enabled(down_enabled)
         self.btn_down_stop.set_enabled(down_enabled)
+        self.btn_cw_start.set_enabled(mode is None)
+        for btn in (self.btn_cw_pause, self.btn_cw_skip, self.btn_cw_cancel):
+            btn.set_enabled(mode == "cw")
         self.btn_clear_bottom.set_enabled(True)
 
     # ---------- rainbow ----------
-    def next_rainbow_color(self) -> int:
-        code = self.rainbow_codes[self.rainbow_idx]
-        self.rainbow_idx = (self.rainbow_idx + 1) % len(self.rainbow_codes)
-        return code
-
     def on_toggle_rainbow(self):
         if self.rainbow_var.get():
             self.scroll_speed_var.set("1")
@@ -455,80 +544,91 @@ class MLEDTerminal(tk.Tk):
         text = self.get_text()
         if not text.strip():
             messagebox.showwarning("Warning", "Text field is empty"); return
-
-        self.stop_scroll()
+        if not self.require_connection():
+            return
 
         if self.rainbow_var.get():
-            first_color = self.next_rainbow_color()
             self.scroll_speed_var.set("1")
-            self.start_scroll(text, color_override=first_color, rainbow_cycle=True)
+            self.engine.call(self.engine.start_scroll(text, speed=1, rainbow=True))
             return
 
-        if self.scroll_speed_var.get() != "0":
-            self.start_scroll(text)
+        if self.scroll_speed_var.get() == "Auto":
+            # start jak prędkość 3, dalej krok dobierany do łącza i tablicy
+            self.engine.call(self.engine.start_scroll(text, speed=3, adaptive=True))
             return
-        self._send_plain(text)
+        speed = int(self.scroll_speed_var.get())
+        if speed != 0:
+            self.engine.call(self.engine.start_scroll(text, speed=speed))
+            return
+        self.engine.call(self.engine.send_text(text, COLOR_MAP.get(self.text_color_var.get())))
 
     def action_clear_line(self):
-        self.stop_scroll()
-        self.stop_timer_job()
-        self.timer_mode = None
-        self.timer_start_ts = None
-        self.timer_down_end_ts = None
-        self.send_bytes(self.build_frame(self.line_var.get(), self.brightness_var.get(), ""))
+        self.engine.call(self.engine.clear())
         self.set_mode(None)
 
     def action_timer_up(self):
         if self.lock_mode not in (None, "up"):
             messagebox.showinfo("Info", "Another feature is active. Press Clear first."); return
         self.set_mode("up")
-        self.stop_timer_job()
-        self.timer_mode = 'up'
-        self.timer_start_ts = time.time()
-        self.tick_timer_up()
+        if not self.require_connection():
+            return
+        self.engine.call(self.engine.timer_up(COLOR_MAP[self.up_color_var.get()], bool(self.up_device_var.get())))
 
     def action_timer_down(self):
         if self.lock_mode not in (None, "down"):
             messagebox.showinfo("Info", "Another feature is active. Press Clear first."); return
         self.set_mode("down")
-        self.stop_timer_job()
+        if not self.require_connection():
+            return
         mm = int(self.down_mm_var.get() or 0)
         ss = int(self.down_ss_var.get() or 0)
-        fmt = f"{mm:02d}:{ss:02d}"
-        total = mm * 60 + ss
-        payload = self.wrap_color(self.cmd_rt(2, fmt), COLOR_MAP[self.down_color_var.get()])
-        self.send_bytes(self.build_frame(self.line_var.get(), self.brightness_var.get(), payload))
-        self.timer_mode = 'down'
-        self.timer_start_ts = time.time()
-        self.timer_down_end_ts = self.timer_start_ts + total
-        if total > 0:
-            self.timer_job = self.after(total * 1000, self.on_countdown_finished)
+        self.engine.call(self.engine.timer_down(
+            mm * 60 + ss, COLOR_MAP[self.down_color_var.get()],
+            finish_text=self.down_finish_text_var.get() or "",
+            finish_secs=int(self.down_finish_secs_var.get() or 1),
+            flash=bool(self.down_flash_var.get())))
+
+    def action_cw_start(self):
+        if not self.require_connection():
+            return
+        if self.lock_mode is not None:
+            messagebox.showinfo("Info", "Another feature is active. Press Clear first."); return
+        steps = coursewalk(int(self.cw_count_var.get()), int(self.cw_minutes_var.get()), int(self.cw_wait_var.get()))
+        self.set_mode("cw")
+        self.engine.call(self.engine.play_sequence(steps))
 
-    def action_timer_stop(self):
-        self.stop_timer_job()
-        if not self.timer_mode and self.lock_mode not in ("up", "down"):
+    def action_cw_pause(self):
+        if self.lock_mode != "cw":
             return
-        now = time.time()
-        if self.timer_mode == 'up' and self.timer_start_ts is not None:
-            elapsed = max(0.0, now - self.timer_start_ts)
-            mm = int(elapsed // 60)
-            ss_full = elapsed % 60
-            ss = int(ss_full)
-            cc = int((ss_full - ss) * 100)
-            txt = f"{ss:02d}.{cc:02d}" if mm == 0 else f"{mm:02d}:{ss:02d}.{cc:02d}"
-            color = COLOR_MAP[self.up_color_var.get()]
+        self.cw_paused = not self.cw_paused
+        if self.cw_paused:
+            self.engine.call(self.engine.pause_sequence())
+            self.btn_cw_pause.set_text("Resume")
         else:
-            remain = max(0.0, (self.timer_down_end_ts or now) - now)
-            mm = int(remain // 60)
-            ss = int(remain % 60)
-            txt = f"{mm:02d}:{ss:02d}"
-            color = COLOR_MAP[self.down_color_var.get()]
-        payload = self.wrap_color(txt, color)
-        self.send_bytes(self.build_frame(self.line_var.get(), self.brightness_var.get(), payload))
+            self.engine.call(self.engine.resume_sequence())
+            self.btn_cw_pause.set_text("Pause")
+
+    def action_cw_skip(self):
+        if self.lock_mode == "cw":
+            self.engine.call(self.engine.skip_step())
+
+    def action_cw_cancel(self):
+        if self.lock_mode != "cw":
+            return
+        self.engine.call(self.engine.cancel_sequence())
+        self.set_mode(None)
+
+    def action_timer_stop(self):
+        if self.lock_mode not in ("up", "down"):
+            return
+        self.engine.call(self.engine.timer_stop())
 
     # ---------- text helpers ----------
     def current_overhead(self) -> int:
-        return len("^cs 10^") + len("^cs 0^") if self.rainbow_var.get() else 0
+        # tęcza przechodzi przez wszystkie kolory, więc liczymy najdłuższy znacznik
+        if self.rainbow_var.get():
+            return max(markup_overhead(code) for code in COLOR_MAP.values())
+        return markup_overhead(COLOR_MAP.get(self.text_color_var.get()))
 
     def enforce_limit(self):
         allowed = max(0, 64 - self.current_overhead())
@@ -581,6 +681,7 @@ class MLEDTerminal(tk.Tk):
         RoundButton(row, text="Scan", command=self.scan_ports,
                     bg=GRAY_BG, hover=GRAY_HOVER, active=GRAY_ACTIVE, fg="#000000",
                     ambient=self.bg).pack(side=tk.LEFT, padx=6)
+        self.targets_row = ttk.Frame(row, style="TFrame"); self.targets_row.pack(side=tk.LEFT, padx=(12,0))
 
         # line / brightness / color
         row2 = ttk.Frame(root, style="TFrame"); row2.pack(fill=tk.X, pady=2)
@@ -599,6 +700,9 @@ class MLEDTerminal(tk.Tk):
         self.color_combo = ttk.Combobox(row2, textvariable=self.text_color_var, values=list(COLOR_MAP.keys()), width=14, state="readonly")
         self.color_combo.pack(side=tk.LEFT, padx=6); self.style_dark_combobox(self.color_combo)
         self.color_combo.bind("<<ComboboxSelected>>", lambda e: (self.update_counter(),))
+        for var in (self.line_var, self.brightness_var, self.text_color_var):
+            var.trace_add("write", self.sync_engine)
+        self.line_var.trace_add("write", self.on_line_changed)
 
         # nagłówek Text
         ttk.Label(root, text="Text to display", style="TLabel", font=header_font).pack(pady=(10, 2), anchor="center")
@@ -632,9 +736,18 @@ class MLEDTerminal(tk.Tk):
         self.scroll_speed_var = tk.StringVar(value="0")
         rb = ttk.Frame(left, style="TFrame"); rb.pack(side=tk.LEFT)
         self.rb_scroll_children = []
-        for v in ["0","1","2","3"]:
+        for v in ["0","1","2","3","Auto"]:
             r = ttk.Radiobutton(rb, text=v, value=v, variable=self.scroll_speed_var, style="TRadiobutton")
             r.pack(side=tk.LEFT, padx=4); self.rb_scroll_children.append(r)
+        # krok wybrany przez tryb Auto
+        self.scroll_rate_var = tk.StringVar(value="")
+        ttk.Label(left, textvariable=self.scroll_rate_var, style="TLabel").pack(side=tk.LEFT, padx=(10,0))
+        # tablica przewija sama (^sc); dotyczy zaznaczonych tablic, reszcie przewija host
+        self.device_scroll_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(srow, text="Device scroll", variable=self.device_scroll_var,
+                       onvalue=True, offvalue=False, command=self.sync_device_scroll,
+                       bg=self.bg, fg=self.fg, activebackground=self.bg, activeforeground=self.fg,
+                       selectcolor=self.bg, highlightthickness=0, bd=0).pack(side=tk.RIGHT, padx=(0,12))
         tk.Checkbutton(srow, text="RAINBOW", variable=self.rainbow_var,
                        onvalue=True, offvalue=False, command=self.on_toggle_rainbow,
                        bg=self.bg, fg=self.fg, activebackground=self.bg, activeforeground=self.fg,
@@ -653,6 +766,12 @@ class MLEDTerminal(tk.Tk):
         self.up_color_var = tk.StringVar(value="Green")
         up_combo = ttk.Combobox(up, textvariable=self.up_color_var, values=list(COLOR_MAP.keys()), width=12, state="readonly")
         up_combo.pack(side=tk.LEFT); self.style_dark_combobox(up_combo)
+        # count-up liczony przez tablicę (^rt); wyłączony = ramki z hosta co 100 ms
+        self.up_device_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(up, text="On display", variable=self.up_device_var,
+                       onvalue=True, offvalue=False,
+                       bg=self.bg, fg=self.fg, activebackground=self.bg, activeforeground=self.fg,
+                       selectcolor=self.bg, highlightthickness=0, bd=0).pack(side=tk.LEFT, padx=(12,0))
         self.btn_up_start = RoundButton(up, text="Start", command=self.action_timer_up,
                                         bg=GREEN_BG, hover=GREEN_HOVER, active=GREEN_ACTIVE, fg="#000000",
                                         ambient=self.bg); self.btn_up_start.pack(side=tk.LEFT, padx=12)
@@ -702,6 +821,34 @@ class MLEDTerminal(tk.Tk):
                        bg=self.bg, fg=self.fg, activebackground=self.bg, activeforeground=self.fg,
                        selectcolor=self.bg, highlightthickness=0, bd=0).pack(side=tk.LEFT)
 
+        # coursewalk (jak w wersji web): "i/n soon", odliczanie, "i/n END"
+        cw = ttk.Frame(timer, style="TFrame"); cw.pack(fill=tk.X, pady=6)
+        ttk.Label(cw, text="Coursewalks", style="TLabel").pack(side=tk.LEFT)
+        self.cw_count_var = tk.StringVar(value="1")
+        cw_combo = ttk.Combobox(cw, textvariable=self.cw_count_var, values=["1","2","3","4"], width=3, state="readonly")
+        cw_combo.pack(side=tk.LEFT, padx=(8,0)); self.style_dark_combobox(cw_combo)
+        ttk.Label(cw, text="Duration (min)", style="TLabel").pack(side=tk.LEFT, padx=(12,4))
+        self.cw_minutes_var = tk.StringVar(value="9")
+        cw_min = ttk.Combobox(cw, textvariable=self.cw_minutes_var, values=["7","8","9","10"], width=4, state="readonly")
+        cw_min.pack(side=tk.LEFT); self.style_dark_combobox(cw_min)
+        ttk.Label(cw, text="Wait (s)", style="TLabel").pack(side=tk.LEFT, padx=(12,4))
+        self.cw_wait_var = tk.StringVar(value="20")
+        cw_wait = ttk.Combobox(cw, textvariable=self.cw_wait_var, values=["10","20","30"], width=4, state="readonly")
+        cw_wait.pack(side=tk.LEFT); self.style_dark_combobox(cw_wait)
+        self.btn_cw_start = RoundButton(cw, text="Start", command=self.action_cw_start,
+                                        bg=GREEN_BG, hover=GREEN_HOVER, active=GREEN_ACTIVE, fg="#000000",
+                                        ambient=self.bg); self.btn_cw_start.pack(side=tk.LEFT, padx=12)
+        self.btn_cw_pause = RoundButton(cw, text="Pause", command=self.action_cw_pause,
+                                        bg=GRAY_BG, hover=GRAY_HOVER, active=GRAY_ACTIVE, fg="#000000",
+                                        ambient=self.bg); self.btn_cw_pause.pack(side=tk.LEFT, padx=4)
+        self.btn_cw_skip = RoundButton(cw, text="Skip", command=self.action_cw_skip,
+                                       bg=GRAY_BG, hover=GRAY_HOVER, active=GRAY_ACTIVE, fg="#000000",
+                                       ambient=self.bg); self.btn_cw_skip.pack(side=tk.LEFT, padx=4)
+        self.btn_cw_cancel = RoundButton(cw, text="Cancel", command=self.action_cw_cancel,
+                                         bg=RED_BG, hover=RED_HOVER, active=RED_ACTIVE, fg="#000000",
+                                         ambient=self.bg); self.btn_cw_cancel.pack(side=tk.LEFT, padx=4)
+        self.cw_paused = False
+
         # wspólny CLEAR
         bottom = ttk.Frame(root, style="TFrame"); bottom.pack(fill=tk.X, pady=(10, 6))
         self.btn_clear_bottom = RoundButton(bottom, text="Clear", command=self.action_clear_line,
@@ -715,22 +862,48 @@ class MLEDTerminal(tk.Tk):
         self.on_after_text_change()
 
     # ---------- scan ports ----------
+    def on_ports_changed(self):
+        # pusty Port: podpowiedź najbardziej prawdopodobnej tablicy
+        best = self.scanner.best()
+        if best is not None and not self.port_var.get().strip() and not self.engine.connected:
+            self.port_var.set(best.device)
+        self.fill_port_list()
+
+    def fill_port_list(self):
+        lb = self.port_list
+        if lb is None or not lb.winfo_exists():
+            self.port_list = None
+            return
+        selected = {self.port_devices[i] for i in lb.curselection()}
+        self.port_devices = [p.device for p in self.scanner.ranked()]
+        lb.delete(0, tk.END)
+        for info in self.scanner.ranked():
+            lb.insert(tk.END, info.label())
+        for i, dev in enumerate(self.port_devices):
+            if dev in selected:
+                lb.selection_set(i)
+
     def scan_ports(self):
-        ports = [p.device for p in serial.tools.list_ports.comports()]
-        if not ports:
-            messagebox.showinfo("Ports", "No ports found"); return
-        dlg = tk.Toplevel(self); dlg.title("Select port"); dlg.configure(bg=self.bg); dlg.geometry("360x280")
-        lb = tk.Listbox(dlg, bg="#111111", fg=self.fg, selectbackground="#374151")
-        for p in ports: lb.insert(tk.END, p)
+        self.scanner.refresh()
+        dlg = tk.Toplevel(self); dlg.title("Select port"); dlg.configure(bg=self.bg); dlg.geometry("520x300")
+        lb = self.port_list = tk.Listbox(dlg, bg="#111111", fg=self.fg, selectbackground="#374151",
+                                         selectmode=tk.EXTENDED)
+        self.fill_port_list()
         lb.pack(fill=tk.BOTH, expand=True, padx=8, pady=8)
         def choose():
             sel = lb.curselection()
-            if sel: self.port_var.set(lb.get(sel[0]))
+            if sel: self.port_var.set(", ".join(self.port_devices[i] for i in sel))
+            self.port_list = None
             dlg.destroy()
-        RoundButton(dlg, text="OK", command=choose, bg=GREEN_BG, hover=GREEN_HOVER, active=GREEN_ACTIVE,
-                    fg="#000000", ambient=self.bg).pack(pady=6)
+        buttons = tk.Frame(dlg, bg=self.bg); buttons.pack(pady=6)
+        RoundButton(buttons, text="OK", command=choose, bg=GREEN_BG, hover=GREEN_HOVER, active=GREEN_ACTIVE,
+                    fg="#000000", ambient=self.bg).pack(side=tk.LEFT, padx=6)
+        # sonda wysyła ^ic na wolne porty; wyniki dochodzą przez poll_engine
+        RoundButton(buttons, text="Probe", command=self.scanner.request_probe, bg=GRAY_BG, hover=GRAY_HOVER,
+                    active=GRAY_ACTIVE, fg="#000000", ambient=self.bg).pack(side=tk.LEFT, padx=6)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
     try:
         app = MLEDTerminal()
         app.mainloop()
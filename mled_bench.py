@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MLED benchmarks: sanitize/frames, wire throughput, tick jitter, Tk latency, CLI start
+python3 mled_bench.py [--duration 180] [--baud 9600] [--json results.json] [--only ticks,tk]
+
+Wire, tick and Tk runs go to the pty emulator (mled_emulator.py), no board needed.
+"""
+
+import sys
+import os
+import json
+import time
+import timeit
+import asyncio
+import argparse
+import platform
+import threading
+import subprocess
+import statistics
+import unicodedata
+
+import mled_core
+from mled_engine import DisplayEngine
+from mled_emulator import Emulator
+
+SECTIONS = ("sanitize", "frames", "wire", "ticks", "tk", "cli")
+# ile ramek może czekać na potwierdzenie w teście przepustowości
+WIRE_WINDOW = 8
+TK_PROBE_MS = 20
+CLI_RUNS = 20
+HERE = os.path.dirname(os.path.abspath(__file__))
+# pamięć po imporcie modułu, w osobnym procesie (ru_maxrss: KiB na Linuksie, bajty na macOS)
+RSS_PROBE = ("import resource, sys, json; import {mod}; r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss; "
+             "print(json.dumps({{'rss_kb': r // 1024 if sys.platform == 'darwin' else r, "
+             "'tkinter': 'tkinter' in sys.modules, 'asyncio': 'asyncio' in sys.modules}}))")
+
+SAMPLES = {
+    "polish": "Zażółć gęślą jaźń – Łódź, Kraków, Gdańsk, Świętokrzyskie, Mistrzostwa Polski ",
+    "german": "Größenwahn über Straßen, Müller-Lüdenscheid, Äpfel, Öfen und Übermut ",
+    "ascii":  "START 12 Kowalski Jan 01:23.45 clear round ",
+}
+
+# sanitize sprzed tablicy translate, jako punkt odniesienia
+def sanitize_reference(text: str) -> str:
+    out = []
+    for ch in text:
+        if ch == '^':
+            out.append('*'); continue
+        ch = mled_core.BASE_MAP.get(ch, ch)
+        deacc = ''.join(c for c in unicodedata.normalize('NFKD', ch) if not unicodedata.combining(c))
+        for c in deacc:
+            try:
+                c.encode('latin-1')
+                o = ord(c)
+                if 32 <= o <= 126 or 224 <= o <= 255:
+                    out.append(c)
+                else:
+                    out.append('*')
+            except Exception:
+                out.append('*')
+    return ''.join(out)
+
+def per_call_us(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+def dist(samples) -> dict:
+    # rozkład w ms
+    xs = sorted(samples)
+    if not xs:
+        return {"n": 0}
+    def pct(q): return round(xs[min(len(xs) - 1, int(q * len(xs)))], 3)
+    return {"n": len(xs), "mean": round(statistics.fmean(xs), 3),
+            "stdev": round(statistics.pstdev(xs), 3),
+            "p50": pct(0.50), "p90": pct(0.90), "p99": pct(0.99), "max": round(xs[-1], 3)}
+
+def bench_sanitize(number: int = 2000):
+    every_char = ''.join(chr(cp) for cp in range(32, 0x3000))
+    if mled_core.sanitize(every_char) != sanitize_reference(every_char):
+        sys.exit("sanitize differs from reference")
+    print(f"{'sanitize':<10}{'chars':>7}{'reference us':>15}{'table us':>12}{'cached us':>12}")
+    rows = []
+    for name, sample in SAMPLES.items():
+        text = sample * 4
+        ref = per_call_us(lambda: sanitize_reference(text), number)
+        table = per_call_us(lambda: mled_core.sanitize.__wrapped__(text), number)
+        cached = per_call_us(lambda: mled_core.sanitize(text), number)
+        print(f"{name:<10}{len(text):>7}{ref:>15.2f}{table:>12.2f}{cached:>12.3f}")
+        rows.append({"sample": name, "chars": len(text), "reference_us": ref, "table_us": table, "cached_us": cached})
+    return rows
+
+def bench_frames(number: int = 20000):
+    payloads = ["12.34", "^cs 2^01:23.45^cs 0^", "^cs 4^" + "X" * 52 + "^cs 0^"]
+    build = lambda p: mled_core.build_frame("7", "1", p)
+    enc = mled_core.FrameEncoder("7", "1")
+    for p in payloads:
+        if bytes(enc.encode(p)) != build(p):
+            sys.exit("FrameEncoder differs from build_frame")
+    print(f"{'frames':<10}{'bytes':>7}{'build_frame/s':>15}{'encode/s':>12}{'encode+copy/s':>15}{'sanitize+build/s':>18}")
+    rows = []
+    for i, p in enumerate(payloads):
+        old = 1e6 / per_call_us(lambda: build(p), number)
+        new = 1e6 / per_call_us(lambda: enc.encode(p), number)
+        copy = 1e6 / per_call_us(lambda: bytes(enc.encode(p)), number)
+        # pełna ścieżka tekstu z GUI: sanitize bez cache + ramka
+        raw = SAMPLES["polish"][:len(p)]
+        full = 1e6 / per_call_us(lambda: build(mled_core.sanitize.__wrapped__(raw)), number)
+        print(f"{'':<10}{len(p) + 4:>7}{old:>15,.0f}{new:>12,.0f}{copy:>15,.0f}{full:>18,.0f}")
+        rows.append({"bytes": len(p) + 4, "build_frame_per_s": old, "encode_per_s": new,
+                     "encode_copy_per_s": copy, "sanitize_build_per_s": full,
+                     "bytes_per_s": old * (len(p) + 4)})
+    return rows
+
+def bench_wire(seconds: float, baud) -> dict:
+    # sanitize + build_frame -> PortPool -> writer -> pty -> emulator, z oknem potwierdzeń;
+    # przy 9600 bodów bufor pty przyjmuje więcej niż łącze, więc liczy się to, co doszło
+    with Emulator(baud) as emu:
+        received = {}
+        emu.on_frame = lambda line, bright, payload, t: received.setdefault(payload, t)
+        pool = mled_core.PortPool()
+        pool.open(emu.path)
+        window = threading.Semaphore(WIRE_WINDOW)
+        acks, sent_at = [], {}
+        errors = 0
+        n = 0
+        t_start = time.monotonic()
+        t_end = t_start + seconds
+        while time.monotonic() < t_end:
+            if not window.acquire(timeout=0.5):
+                continue
+            n += 1
+            payload = mled_core.sanitize.__wrapped__(f"Wynik {n} Łódź")
+            frame = mled_core.build_frame("7", "1", payload)
+            t0 = time.monotonic()
+            sent_at[payload.encode("latin-1")] = t0
+            def done(err, t0=t0):
+                nonlocal errors
+                errors += err is not None
+                acks.append((time.monotonic() - t0) * 1000.0)
+                window.release()
+            pool.send(frame, "7", "1", coalesce=False, priority=mled_core.PRIO_TIMER, on_done=done)
+        # poczekaj, aż emulator odbierze to, co zostało w buforze
+        seen = -1
+        while seen != emu.frames:
+            seen = emu.frames
+            time.sleep(0.3)
+        pool.close_all()
+        span = max(received.values(), default=t_end) - t_start
+        wire = [(received[k] - t0) * 1000.0 for k, t0 in sent_at.items() if k in received]
+        res = {"baud": baud, "seconds": span, "frames_sent": n, "frames_seen": emu.frames,
+               "ack_errors": errors, "fps": emu.frames / span, "bytes_per_s": emu.bytes / span,
+               "ack_ms": dist(acks), "wire_ms": dist(wire), "frame_errors": emu.parser.errors}
+    print(f"wire {baud or 'unlimited'} baud: {res['fps']:,.0f} frames/s, {res['bytes_per_s']:,.0f} B/s, "
+          f"ack p99 {res['ack_ms'].get('p99', 0)} ms, wire p99 {res['wire_ms'].get('p99', 0)} ms")
+    return res
+
+def _arrivals(times, period_ms: float) -> dict:
+    gaps = [(b - a) * 1000.0 for a, b in zip(times, times[1:])]
+    return {"interval_ms": dist(gaps), "jitter_ms": dist(abs(g - period_ms) for g in gaps)}
+
+async def _run_ticks(seconds: float, path: str) -> dict:
+    # scroll i count-up z hosta jednocześnie, każdy na swojej linii; oba efekty
+    # idą jednym zadaniem kompozytora, więc opóźnienie taktu jest wspólne
+    eng = DisplayEngine()
+    eng.bind_loop()
+    failed = await eng.open([path])
+    if failed:
+        raise RuntimeError(failed)
+    await eng.start_scroll("Mistrzostwa Polski - runda finalowa - wyniki na zywo", speed=3, line="5")
+    await eng.timer_up(mled_core.COLOR_MAP["Green"], on_display=False, line="7")
+    await asyncio.sleep(seconds)
+    late = eng.ticker.stats("compositor")
+    await eng.close()
+    return {"scroll_step": late, "tick_timer_up": late}
+
+def bench_ticks(seconds: float, baud) -> dict:
+    arrivals = {"5": [], "7": []}
+    with Emulator(baud) as emu:
+        emu.on_frame = lambda line, bright, payload, t: arrivals.get(line, []).append(t)
+        lateness = asyncio.run(_run_ticks(seconds, emu.path))
+    res = {"baud": baud, "seconds": seconds,
+           "scroll_step": {"lateness": lateness["scroll_step"], **_arrivals(arrivals["5"], mled_core.SCROLL_DELAYS[3])},
+           "tick_timer_up": {"lateness": lateness["tick_timer_up"], **_arrivals(arrivals["7"], 100)}}
+    for name in ("scroll_step", "tick_timer_up"):
+        late, jit = res[name]["lateness"], res[name]["jitter_ms"]
+        print(f"{name:<14} late p50 {late['p50_ms']:.2f} p99 {late['p99_ms']:.2f} max {late['max_ms']:.2f} ms, "
+              f"skipped {late['skipped']}, wire jitter p99 {jit.get('p99', 0)} ms")
+    return res
+
+def bench_tk(seconds: float, baud) -> dict:
+    # opóźnienie pętli Tk (after co TK_PROBE_MS) przy scrollu w GUI i drugim silniku z count-up
+    try:
+        import tkinter as tk
+        tk.Tk().destroy()
+    except Exception as e:
+        print(f"tk skipped: {e}")
+        return {"skipped": str(e)}
+    import MLED
+    with Emulator(baud) as emu:
+        app = MLED.MLEDTerminal()
+        app.port_var.set(emu.path)
+        app.open_serial()
+        app.engine.call(app.engine.start_scroll("Tk latency probe - scroll in the GUI engine", speed=3))
+        timer = DisplayEngine(line="7")
+        timer.start_background()
+        timer.call(timer.open([emu.path])).result()
+        timer.call(timer.timer_up(mled_core.COLOR_MAP["Green"], on_display=False))
+        late = []
+        expected = [time.monotonic() + TK_PROBE_MS / 1000.0]
+        def probe():
+            now = time.monotonic()
+            late.append((now - expected[0]) * 1000.0)
+            expected[0] = now + TK_PROBE_MS / 1000.0
+            app.after(TK_PROBE_MS, probe)
+        app.after(TK_PROBE_MS, probe)
+        app.after(int(seconds * 1000), app.quit)
+        app.mainloop()
+        timer.stop_background()
+        app.on_close()
+    res = {"baud": baud, "seconds": seconds, "probe_ms": TK_PROBE_MS, "lateness_ms": dist(late)}
+    print(f"tk after() late p50 {res['lateness_ms'].get('p50', 0)} p99 {res['lateness_ms'].get('p99', 0)} ms")
+    return res
+
+def _cold_ms(cmd, runs: int) -> dict:
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, cwd=HERE, stdout=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return dist(times)
+
+def bench_cli(runs: int = CLI_RUNS) -> dict:
+    # zimny start jednego "mled send" na loop:// i pamięć po imporcie: CLI vs GUI
+    res = {"runs": runs,
+           "python_ms": _cold_ms([sys.executable, "-c", "pass"], runs),
+           "send_ms": _cold_ms([sys.executable, "mled_cli.py", "send", "--port", "loop://", "bench"], runs)}
+    for mod in ("mled_cli", "MLED"):
+        try:
+            out = subprocess.run([sys.executable, "-c", RSS_PROBE.format(mod=mod)], cwd=HERE,
+                                 capture_output=True, text=True, check=True).stdout
+            res[mod] = json.loads(out)
+            res[mod]["import_ms"] = _cold_ms([sys.executable, "-c", f"import {mod}"], runs)
+        except (subprocess.CalledProcessError, ValueError) as e:
+            res[mod] = {"skipped": str(e)}
+    print(f"python start   p50 {res['python_ms'].get('p50', 0)} ms")
+    print(f"mled send      p50 {res['send_ms'].get('p50', 0)} ms  p99 {res['send_ms'].get('p99', 0)} ms")
+    for mod in ("mled_cli", "MLED"):
+        r = res[mod]
+        if "skipped" in r:
+            print(f"{mod:<14} skipped")
+        else:
+            print(f"{mod:<14} import p50 {r['import_ms'].get('p50', 0)} ms, max RSS {r['rss_kb'] / 1024:.1f} MiB, "
+                  f"tkinter {'yes' if r['tkinter'] else 'no'}, asyncio {'yes' if r['asyncio'] else 'no'}")
+    return res
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="MLED benchmarks")
+    ap.add_argument("--duration", type=float, default=180.0, help="seconds for tick and Tk runs")
+    ap.add_argument("--wire-seconds", type=float, default=5.0)
+    ap.add_argument("--baud", type=int, default=mled_core.BAUDRATE, help="emulated link speed, 0 = unlimited")
+    ap.add_argument("--only", default=",".join(SECTIONS), help="comma separated: " + ",".join(SECTIONS))
+    ap.add_argument("--json", help="write results to this file ('-' = stdout)")
+    args = ap.parse_args(argv)
+    only = [s.strip() for s in args.only.split(",") if s.strip()]
+    baud = args.baud or None
+
+    results = {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                        "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "duration": args.duration, "baud": baud}}
+    runs = {"sanitize": bench_sanitize,
+            "frames": bench_frames,
+            "wire": lambda: {"unlimited": bench_wire(args.wire_seconds, None),
+                             "paced": bench_wire(args.wire_seconds, baud)},
+            "ticks": lambda: bench_ticks(args.duration, baud),
+            "tk": lambda: bench_tk(args.duration, baud),
+            "cli": bench_cli}
+    out = sys.stdout
+    if args.json == "-":
+        # tabelki na stderr, na stdout tylko JSON
+        sys.stdout = sys.stderr
+    try:
+        for name in only:
+            if name not in runs:
+                sys.exit(f"unknown section {name}")
+            results[name] = runs[name]()
+            print()
+    finally:
+        sys.stdout = out
+    if args.json == "-":
+        json.dump(results, sys.stdout, indent=2)
+    elif args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MLED session capture and replay
+python3 mled_capture.py info FILE [FILE ...]
+python3 mled_capture.py replay FILE --port COM3 [--speed 2 | --fast] [--raw]
+
+Capture file: 16-byte header (magic, start wall time), then one record per
+PortPool.send call: <t_ns:u64 line:u8 priority:u8 flags:u8 length:u16> + frame.
+"""
+
+import sys
+import time
+import struct
+import argparse
+import threading
+import statistics
+from collections import Counter, defaultdict, deque
+from typing import Optional, Iterator
+
+from mled_core import log, PRIO_TEXT, PortPool, DisplayLink
+
+MAGIC = b"MLEDCAP1"
+HEADER = struct.Struct("<8sd")
+RECORD = struct.Struct("<QBBBH")
+FLAG_COALESCE = 0x01
+# co ile sekund wątek zapisuje bufor na dysk
+FLUSH_SECS = 0.5
+
+class CaptureWriter:
+    # Append-only capture. record() only appends to a deque (atomic);
+    # packing and file I/O happen on a background thread, so the caller
+    # (engine loop, GUI) never waits for the disk.
+    def __init__(self, path: str):
+        self.path = path
+        self.frames = 0
+        self.bytes = 0
+        self._t0 = time.monotonic_ns()
+        self._buf: "deque[tuple]" = deque()
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, time.time()))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="mled-capture", daemon=True)
+        self._thread.start()
+
+    def record(self, data, line: str, priority: int = PRIO_TEXT, coalesce: bool = True):
+        # memoryview z FrameEncoder jest nadpisywany, więc kopia
+        self._buf.append((time.monotonic_ns() - self._t0, line, priority, coalesce,
+                          data if isinstance(data, bytes) else bytes(data)))
+
+    def _drain(self):
+        buf = self._buf
+        if not buf:
+            return
+        out = bytearray()
+        n = 0
+        while buf:
+            t, line, priority, coalesce, data = buf.popleft()
+            out += RECORD.pack(t, int(line), priority, FLAG_COALESCE if coalesce else 0, len(data))
+            out += data
+            n += 1
+        self._file.write(out)
+        self._file.flush()
+        self.frames += n
+        self.bytes += len(out)
+
+    def _run(self):
+        while not self._stop.wait(FLUSH_SECS):
+            try:
+                self._drain()
+            except OSError as e:
+                log.error("capture write failed: %s", e)
+                return
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(2.0)
+        self._drain()
+        self._file.close()
+
+def read_capture(path: str) -> "Iterator[tuple[int, str, int, bool, bytes]]":
+    # (t_ns, linia, priorytet, coalesce, ramka); urwany ostatni rekord jest pomijany
+    with open(path, "rb") as f:
+        head = f.read(HEADER.size)
+        if len(head) < HEADER.size or HEADER.unpack(head)[0] != MAGIC:
+            raise ValueError(f"{path}: not an MLED capture")
+        while True:
+            rec = f.read(RECORD.size)
+            if len(rec) < RECORD.size:
+                return
+            t, line, priority, flags, n = RECORD.unpack(rec)
+            data = f.read(n)
+            if len(data) < n:
+                return
+            yield t, str(line), priority, bool(flags & FLAG_COALESCE), data
+
+def capture_info(path: str) -> dict:
+    times = defaultdict(list)
+    total = nbytes = 0
+    last = 0
+    for t, line, _, _, data in read_capture(path):
+        times[line].append(t)
+        total += 1
+        nbytes += len(data)
+        last = t
+    per_line = {}
+    for line, ts in sorted(times.items(), key=lambda kv: int(kv[0])):
+        gaps = sorted((b - a) / 1e6 for a, b in zip(ts, ts[1:]))
+        per_line[line] = {"frames": len(ts),
+                          "interval_p50_ms": gaps[len(gaps) // 2] if gaps else 0.0,
+                          "interval_p99_ms": gaps[min(len(gaps) - 1, int(0.99 * len(gaps)))] if gaps else 0.0,
+                          "interval_stdev_ms": statistics.pstdev(gaps) if len(gaps) > 1 else 0.0}
+    secs = last / 1e9
+    return {"frames": total, "bytes": nbytes, "seconds": secs,
+            "fps": total / secs if secs else 0.0, "lines": per_line}
+
+def replay(path: str, pool: Optional[PortPool] = None, link: Optional[DisplayLink] = None,
+           speed: Optional[float] = 1.0, stop: Optional[threading.Event] = None) -> int:
+    # przez PortPool (cache, budżet, kolejki jak na żywo) albo surowo: bez cache,
+    # budżetu i łączenia, ale przez kolejkę writera, bo to on jest właścicielem portu;
+    # speed=None: bez czekania
+    start = time.monotonic_ns()
+    n = 0
+    for t, line, priority, coalesce, data in read_capture(path):
+        if stop is not None and stop.is_set():
+            break
+        if speed:
+            delay = (start + t / speed - time.monotonic_ns()) / 1e9
+            if delay > 0:
+                time.sleep(delay)
+        if pool is not None:
+            pool.send(data, line, chr(data[1 + len(line)]), coalesce, priority)
+        else:
+            # pełna kolejka wyrzuciłaby starą ramkę, więc surowy replay czeka
+            while link.writer.queue_depth >= link.writer.maxsize:
+                time.sleep(0.001)
+            link.writer.submit(data, None, priority, None, line)
+        n += 1
+    return n
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="MLED capture tools")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    info = sub.add_parser("info", help="frame counts and timing per line")
+    info.add_argument("files", nargs="+")
+    rp = sub.add_parser("replay", help="stream a capture to a port or emulator")
+    rp.add_argument("file")
+    rp.add_argument("--port", required=True, help="serial port or pyserial URL")
+    rp.add_argument("--speed", type=float, default=1.0, help="time scale, 2 = twice as fast")
+    rp.add_argument("--fast", action="store_true", help="as fast as possible")
+    rp.add_argument("--raw", action="store_true", help="every frame as recorded, bypassing cache, budget and coalescing")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "info":
+        for path in args.files:
+            st = capture_info(path)
+            print(f"{path}: {st['frames']} frames, {st['bytes']} B, {st['seconds']:.1f} s, {st['fps']:.2f} frames/s")
+            for line, ls in st["lines"].items():
+                print(f"  line {line:>2}: {ls['frames']:6d} frames  interval p50 {ls['interval_p50_ms']:8.1f} ms"
+                      f"  p99 {ls['interval_p99_ms']:8.1f} ms  stdev {ls['interval_stdev_ms']:7.1f} ms")
+        return
+
+    speed = None if args.fast else args.speed
+    pool = PortPool()
+    link = pool.open(args.port)
+    try:
+        t0 = time.monotonic()
+        if args.raw:
+            n = replay(args.file, link=link, speed=speed)
+        else:
+            n = replay(args.file, pool=pool, speed=speed)
+        # kolejki writerów muszą zejść przed zamknięciem portu
+        deadline = time.monotonic() + 5.0
+        while pool.backlog() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        print(f"{n} frames in {time.monotonic() - t0:.1f} s")
+        counts = Counter({"written": link.writer.frames_written, "coalesced": link.writer.frames_coalesced,
+                          "suppressed": link.cache.frames_suppressed, "shed": link.budget.frames_shed})
+        if not args.raw:
+            print(", ".join(f"{k} {v}" for k, v in counts.items()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.close_all()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MLED command line: one frame per call, no GUI, no event loop
+python3 mled_cli.py send --port COM3 --line 7 --color Red "text"
+python3 mled_cli.py timer-down --port COM3 --line 7 5:00 [--finish GO --finish-secs 5]
+python3 mled_cli.py scroll --port COM3 --line 7 [--speed 1-3] [--secs 30 | --device] "text"
+python3 mled_cli.py clear --port COM3 --line 7
+python3 mled_cli.py pages --port COM3 --lines 3-8 [--dwell 5] [--header] [--width 32] results.csv
+
+Only mled_core and pyserial are imported (no tkinter, no asyncio), so cron
+jobs and scoring hooks can call it many times a minute. --port takes a
+comma separated list for several boards. Exit code 1 on a port error.
+"""
+
+import sys
+import time
+import argparse
+
+import serial
+
+from mled_core import (
+    LINE_CHOICES, BRIGHTNESS_CHOICES, SCROLL_DELAYS, FINISH_STATIC_MAX,
+    build_frame, cmd_sc, plain_frame, sanitize, parse_color, parse_clock,
+    countdown_payload, finish_message,
+    open_port, ScrollRing,
+)
+from mled_pager import Pager, PAGER_DWELL, parse_lines
+
+
+def _color(value: str):
+    try:
+        return parse_color(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+def _lines(value: str) -> "list[str]":
+    try:
+        return parse_lines(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+def _clock(value: str) -> int:
+    clock = parse_clock(value)
+    if clock is None:
+        raise argparse.ArgumentTypeError("time must be mm:ss or seconds")
+    return int(clock[0])
+
+class Boards:
+    # Otwarte porty; write() idzie na wszystkie i czeka na opróżnienie bufora.
+    def __init__(self, names: str):
+        self.ports = []
+        try:
+            for name in (n.strip() for n in names.split(",")):
+                if name:
+                    self.ports.append(open_port(name))
+        except Exception:
+            self.close()
+            raise
+
+    def write(self, data: bytes):
+        for port in self.ports:
+            port.write(data)
+        for port in self.ports:
+            port.flush()
+
+    def close(self):
+        for port in self.ports:
+            port.close()
+
+def cmd_send(boards: Boards, args):
+    boards.write(plain_frame(args.line, args.bright, sanitize(" ".join(args.text)), args.color))
+
+def cmd_clear(boards: Boards, args):
+    boards.write(build_frame(args.line, args.bright, ""))
+
+def cmd_timer_down(boards: Boards, args):
+    boards.write(build_frame(args.line, args.bright, countdown_payload(args.time, args.color)))
+    msg = finish_message(args.finish)
+    if not msg:
+        return
+    # tablica liczy sama; tekst końcowy wymaga, żeby proces poczekał
+    time.sleep(args.time)
+    secs = max(1, min(180, args.finish_secs))
+    if len(msg) > FINISH_STATIC_MAX:
+        # jak w silniku: dłuższy tekst przewijany
+        _host_scroll(boards, args.line, args.bright, msg, args.color, 1, secs)
+    else:
+        boards.write(plain_frame(args.line, args.bright, msg, args.color))
+        time.sleep(secs)
+    boards.write(build_frame(args.line, args.bright, ""))
+
+def cmd_scroll(boards: Boards, args):
+    text = sanitize(" ".join(args.text))
+    if args.device:
+        boards.write(plain_frame(args.line, args.bright, text[:64], args.color, prefix=cmd_sc(args.speed)))
+        return
+    _host_scroll(boards, args.line, args.bright, text, args.color, args.speed, args.secs)
+    if args.clear:
+        boards.write(build_frame(args.line, args.bright, ""))
+
+def _host_scroll(boards: Boards, line: str, bright: str, text: str, color, speed: int, secs: float):
+    ring = ScrollRing(text[:64] + "   ", plain_frame)
+    ring.build(line, bright, [color])
+    frames = ring.frames[color]
+    step = SCROLL_DELAYS[speed] / 1000.0
+    start = time.monotonic()
+    end = start + secs
+    k = 0
+    while True:
+        due = start + k * step
+        if due >= end:
+            break
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        boards.write(frames[k % len(frames)])
+        k += 1
+
+def cmd_pages(boards: Boards, args):
+    pager = Pager(args.file, args.lines, args.bright, args.width, args.color, args.time_color,
+                  args.header, args.delimiter)
+    start = time.monotonic()
+    k = 0
+    while args.pages is None or k < args.pages:
+        delay = start + k * args.dwell - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        changes = pager.changes()
+        if changes is None:
+            break
+        # zmienione linie strony jednym zapisem
+        if changes:
+            boards.write(b"".join(frame for _, frame in changes))
+        k += 1
+
+COMMANDS = {"send": cmd_send, "clear": cmd_clear, "timer-down": cmd_timer_down, "scroll": cmd_scroll,
+            "pages": cmd_pages}
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="mled", description="Send frames to MLED boards without the GUI")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--port", required=True, help="serial port(s), comma separated (loop:// for testing)")
+    common.add_argument("--line", default="7", choices=LINE_CHOICES)
+    common.add_argument("--bright", default="1", choices=BRIGHTNESS_CHOICES)
+    common.add_argument("--color", type=_color, default=None, help="name (Red, Light Blue) or code 1-10")
+
+    p = sub.add_parser("send", parents=[common], help="static text")
+    p.add_argument("text", nargs="+")
+    sub.add_parser("clear", parents=[common], help="empty line")
+    p = sub.add_parser("timer-down", parents=[common], help="countdown run by the board (^rt)")
+    p.add_argument("time", type=_clock, help="mm:ss or seconds")
+    p.add_argument("--finish", default="", help="text shown at zero (the command waits for it)")
+    p.add_argument("--finish-secs", type=int, default=5)
+    p = sub.add_parser("scroll", parents=[common], help="marquee")
+    p.add_argument("text", nargs="+")
+    p.add_argument("--speed", type=int, default=1, choices=sorted(SCROLL_DELAYS))
+    p.add_argument("--secs", type=float, default=30.0, help="how long the host scrolls")
+    p.add_argument("--device", action="store_true", help="one ^sc frame, the board scrolls itself")
+    p.add_argument("--clear", action="store_true", help="clear the line when done")
+    p = sub.add_parser("pages", parents=[common], help="CSV results paged over several lines")
+    p.add_argument("file", help="CSV: start number, name, ..., time")
+    p.add_argument("--lines", type=_lines, default=parse_lines("1-15"), help="e.g. 3-8 or 1,3,5")
+    p.add_argument("--dwell", type=float, default=PAGER_DWELL, help="seconds per page")
+    p.add_argument("--width", type=int, default=0, help="pad rows to this width, time right-aligned")
+    p.add_argument("--time-color", type=_color, default=None)
+    p.add_argument("--header", action="store_true", help="skip the first CSV row")
+    p.add_argument("--delimiter", help="CSV separator (default: guessed)")
+    p.add_argument("--pages", type=int, help="stop after this many pages (default: loop)")
+    return ap
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        boards = Boards(args.port)
+    except (serial.SerialException, OSError, ValueError) as e:
+        print(f"mled: {e}", file=sys.stderr)
+        return 1
+    try:
+        COMMANDS[args.cmd](boards, args)
+    except KeyboardInterrupt:
+        return 130
+    except (serial.SerialException, OSError) as e:
+        print(f"mled: {e}", file=sys.stderr)
+        return 1
+    finally:
+        boards.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+MLED multi-line compositor: an independent effect per line (text, scroll,
+count up, countdown) on one tick job. Frames due in the same tick go to
+each board in a single write (PortPool.batch). DisplayEngine runs all of
+its line effects here, so the GUI, the control server and scripts share
+one implementation of each.
+"""
+
+import time
+from typing import Optional, Callable, Iterable
+
+from mled_core import (
+    RT_COUNT_UP, UP_RESYNC_SECS, SCROLL_DELAYS, FINISH_STATIC_MAX,
+    ADAPT_MIN_MS, ADAPT_HEADROOM, ADAPT_BACKOFF, ADAPT_DECAY, MAX_STRETCH_MS,
+    PRIO_TIMER, PRIO_TEXT, PRIO_SCROLL,
+    build_frame, wrap_color, cmd_rt, cmd_sc, cmd_fd, fmt_elapsed, fmt_clock, plain_frame, sanitize,
+    countdown_payload, finish_message, flash_payload,
+    FrameEncoder, FrameTrace, ScrollRing, PortPool, TickScheduler,
+)
+
+# ramki należne w ciągu tylu ms idą razem z bieżącym tickiem
+COMPOSE_SLACK_MS = 5
+HOST_TICK_MS = 100
+
+def _ms(ms: float) -> int:
+    return int(ms * 1_000_000)
+
+class LineEffect:
+    # State of one line. due_ns is the monotonic deadline of the next frame
+    # (None = nothing scheduled); frame(now, comp) returns (data, priority,
+    # coalesce, targets) or None and moves due_ns forward. targets None =
+    # every board. Periodic effects set stream to their priority and take
+    # the period from comp.pace(). expires: the effect ends on its own
+    # (DisplayEngine reports that as "idle").
+    __slots__ = ("line", "brightness", "due_ns", "targets")
+    stream: Optional[int] = None
+    expires = False
+
+    def __init__(self, line: str, brightness: str, targets: Optional[Iterable[str]] = None):
+        self.line = line
+        self.brightness = brightness
+        self.due_ns: Optional[int] = time.monotonic_ns()
+        self.targets = None if targets is None else list(targets)
+
+    def frame(self, now_ns: int, comp: "Compositor"):
+        raise NotImplementedError
+
+    @property
+    def finished(self) -> bool:
+        return self.due_ns is None
+
+    def frozen(self, now_ns: int) -> Optional[str]:
+        # payload zatrzymanego licznika (STOP); None dla efektów bez zegara
+        return None
+
+    def release(self, pool: PortPool):
+        # efekt zdjęty z linii: zatrzymany, zastąpiony albo zakończony
+        pass
+
+class TextEffect(LineEffect):
+    # Static text; with secs the line is cleared afterwards.
+    __slots__ = ("payload", "secs", "_shown")
+
+    def __init__(self, line: str, brightness: str, text: str, color: Optional[int] = None,
+                 secs: Optional[float] = None, markup: bool = False, targets: Optional[Iterable[str]] = None):
+        super().__init__(line, brightness, targets)
+        self.payload = build_frame(line, brightness, text) if markup else \
+            plain_frame(line, brightness, sanitize(text), color)
+        self.secs = secs
+        self._shown = False
+
+    @property
+    def expires(self) -> bool:
+        return self.secs is not None
+
+    def frame(self, now_ns: int, comp: "Compositor"):
+        if self._shown:
+            self.due_ns = None
+            return build_frame(self.line, self.brightness, ""), PRIO_TEXT, True, self.targets
+        self._shown = True
+        self.due_ns = None if self.secs is None else now_ns + _ms(self.secs * 1000)
+        return self.payload, PRIO_TEXT, True, self.targets
+
+class ScrollEffect(LineEffect):
+    # Host marquee from a precomputed ring; missed steps are skipped and the
+    # step stretches when the link is busy. Several colors = rainbow, the
+    # next one after every full pass. adaptive: the step follows the drain
+    # time measured on the boards. device: boards that scroll by themselves
+    # get one ^sc frame, the host scrolls only for targets.
+    __slots__ = ("ring", "colors", "color_idx", "idx", "delay_ms", "adaptive", "device", "_measuring")
+    stream = PRIO_SCROLL
+
+    def __init__(self, line: str, brightness: str, text: str, speed: int = 1, color: Optional[int] = None,
+                 targets: Optional[Iterable[str]] = None, colors: Optional[Iterable[Optional[int]]] = None,
+                 adaptive: bool = False, device: Optional[Iterable[str]] = None):
+        super().__init__(line, brightness, targets)
+        base = sanitize(text)[:64]
+        self.colors = list(colors) if colors else [color]
+        self.color_idx = 0
+        # wszystkie obroty (i kolory tęczy) liczone raz, krok = indeks + zapis
+        self.ring = ScrollRing(base + "   ", plain_frame)
+        self.ring.build(line, brightness, self.colors)
+        self.idx = 0
+        self.delay_ms = SCROLL_DELAYS.get(speed, SCROLL_DELAYS[1])
+        self.adaptive = adaptive
+        self.device = None
+        if device:
+            self.device = (plain_frame(line, brightness, base, self.colors[0], prefix=cmd_sc(speed)), list(device))
+        self._measuring = False
+
+    def frame(self, now_ns: int, comp: "Compositor"):
+        if self.device is not None:
+            data, boards = self.device
+            self.device = None
+            if self.targets is not None and not self.targets:
+                self.due_ns = None  # wszystkie tablice przewijają same
+            return data, PRIO_TEXT, True, boards
+        pool = comp.pool
+        if self.adaptive and not self._measuring:
+            pool.measure_drain(True, self.targets)
+            self._measuring = True
+        # zaległość sprawdzana przed wysłaniem nowej ramki: poprzednia jeszcze nie zeszła
+        behind = self.adaptive and pool.backlog(self.targets) > 0
+        data = self.ring.frames[self.colors[self.color_idx]][self.idx]
+        self.idx = (self.idx + 1) % len(self.ring)
+        if not self.idx and len(self.colors) > 1:
+            self.color_idx = (self.color_idx + 1) % len(self.colors)
+        if self.adaptive:
+            self.delay_ms = self._adapt(comp, len(data), behind)
+            period = _ms(self.delay_ms)
+        else:
+            period = _ms(comp.pace(self.delay_ms, len(data), PRIO_SCROLL, self.targets))
+        self.due_ns += period
+        if self.due_ns <= now_ns:
+            self.due_ns += ((now_ns - self.due_ns) // period + 1) * period
+        return data, PRIO_SCROLL, True, self.targets
+
+    def _adapt(self, comp: "Compositor", nbytes: int, behind: bool) -> int:
+        # zaległość w kolejce writera = łącze albo tablica nie nadąża: wydłuż krok;
+        # bez zaległości skracaj powoli do zmierzonego czasu wysłania z zapasem
+        floor = max(int(comp.pool.drain_ms(self.targets) * ADAPT_HEADROOM),
+                    comp.pace(ADAPT_MIN_MS, nbytes, PRIO_SCROLL, self.targets))
+        if behind:
+            delay = int(self.delay_ms * ADAPT_BACKOFF) + 1
+        else:
+            delay = int(self.delay_ms * ADAPT_DECAY)
+        return min(MAX_STRETCH_MS, max(floor, delay))
+
+    def release(self, pool: PortPool):
+        if self._measuring:
+            self._measuring = False
+            pool.measure_drain(False, self.targets)
+
+class CountUpEffect(LineEffect):
+    # on_display: the board counts (^rt) and the host only resyncs;
+    # otherwise the host sends the time every HOST_TICK_MS. Stays in the
+    # compositor until stopped, so STOP can freeze it.
+    __slots__ = ("color", "on_display", "start_ns", "encoder")
+
+    def __init__(self, line: str, brightness: str, color: Optional[int] = None, on_display: bool = False,
+                 targets: Optional[Iterable[str]] = None):
+        super().__init__(line, brightness, targets)
+        self.color = color
+        self.on_display = on_display
+        self.start_ns = self.due_ns
+        self.encoder = None if on_display else FrameEncoder(line, brightness)
+
+    @property
+    def stream(self) -> Optional[int]:
+        return None if self.on_display else PRIO_TIMER
+
+    @property
+    def finished(self) -> bool:
+        return False
+
+    def frame(self, now_ns: int, comp: "Compositor"):
+        elapsed = fmt_elapsed(max(0, now_ns - self.start_ns) / 1e9)
+        if self.on_display:
+            if not UP_RESYNC_SECS:
+                self.due_ns = None
+            else:
+                self.due_ns = now_ns + _ms(UP_RESYNC_SECS * 1000)
+            payload = wrap_color(cmd_rt(RT_COUNT_UP, elapsed), self.color)
+            return build_frame(self.line, self.brightness, payload), PRIO_TIMER, True, self.targets
+        data = self.encoder.encode(wrap_color(elapsed, self.color))
+        self.due_ns = now_ns + _ms(comp.pace(HOST_TICK_MS, len(data), PRIO_TIMER, self.targets))
+        return data, PRIO_TIMER, True, self.targets
+
+    def frozen(self, now_ns: int) -> Optional[str]:
+        return wrap_color(fmt_elapsed(max(0, now_ns - self.start_ns) / 1e9), self.color)
+
+class CountDownEffect(LineEffect):
+    # ^rt countdown on the board, then the finish text for finish_secs and
+    # an empty line. Up to FINISH_STATIC_MAX characters the text stands (or
+    # flashes with ^fs); a longer one scrolls, after a ^fd flash if asked.
+    # Without a finish text the effect stays until end_ns (STOP can freeze it).
+    __slots__ = ("color", "end_ns", "msg", "flash", "finish_ns", "clear_ns", "scroll", "_phase")
+    expires = True
+
+    def __init__(self, line: str, brightness: str, seconds: int, color: Optional[int] = None,
+                 finish_text: str = "", finish_secs: int = 5, flash: bool = False,
+                 targets: Optional[Iterable[str]] = None):
+        super().__init__(line, brightness, targets)
+        self.color = color
+        self.end_ns = self.due_ns + _ms(max(0, int(seconds)) * 1000)
+        self.msg = finish_message(finish_text)
+        self.flash = flash
+        self.finish_ns = _ms(max(1, min(180, int(finish_secs or 1))) * 1000)
+        self.clear_ns = 0
+        self.scroll: Optional[ScrollEffect] = None
+        self._phase = 0
+
+    @property
+    def stream(self) -> Optional[int]:
+        return None if self.scroll is None else PRIO_SCROLL
+
+    def frame(self, now_ns: int, comp: "Compositor"):
+        if self._phase == 0:
+            self._phase = 1
+            total = (self.end_ns - self.due_ns) // 1_000_000_000
+            self.due_ns = self.end_ns
+            return build_frame(self.line, self.brightness, countdown_payload(total, self.color)), \
+                PRIO_TIMER, True, self.targets
+        if self._phase == 1:
+            self._phase = 2
+            if not self.msg:
+                # tablica pokazuje 00:00, nic do wysłania
+                self.due_ns = None
+                return None
+            self.clear_ns = now_ns + self.finish_ns
+            if len(self.msg) <= FINISH_STATIC_MAX:
+                self.due_ns = self.clear_ns
+                payload = flash_payload(self.msg, self.color) if self.flash else wrap_color(self.msg, self.color)
+                return build_frame(self.line, self.brightness, payload), PRIO_TEXT, True, self.targets
+            self.scroll = ScrollEffect(self.line, self.brightness, self.msg, 1, self.color, self.targets)
+            if self.flash:
+                # miganie całej linii, przewijanie od następnego ticku
+                self.due_ns = now_ns
+                return build_frame(self.line, self.brightness, cmd_fd(self.color)), PRIO_TEXT, False, self.targets
+        if self.scroll is not None and now_ns < self.clear_ns:
+            out = self.scroll.frame(now_ns, comp)
+            self.due_ns = min(self.scroll.due_ns, self.clear_ns)
+            return out
+        self.scroll = None
+        self.due_ns = None
+        return build_frame(self.line, self.brightness, ""), PRIO_TEXT, True, self.targets
+
+    def frozen(self, now_ns: int) -> Optional[str]:
+        if self._phase != 1:
+            return None
+        remain = max(0, self.end_ns - now_ns) // 1_000_000_000
+        return wrap_color(fmt_clock(remain, False), self.color)
+
+class Compositor:
+    # One effect per line, all on a single ticker job armed for the earliest
+    # deadline. A tick sends every frame due within COMPOSE_SLACK_MS inside
+    # PortPool.batch(), so lines changing together leave in one write().
+    # Scroll and host timer periods stretch with the link budget.
+    def __init__(self, pool: PortPool, ticker: TickScheduler, send: Callable,
+                 on_finished: Optional[Callable] = None):
+        self.pool = pool
+        self.ticker = ticker
+        # send(data, coalesce, priority, line, brightness, targets), np. DisplayEngine.send_frame
+        self.send = send
+        # on_finished(effect) gdy efekt z expires skończył się sam
+        self.on_finished = on_finished
+        self.effects: "dict[str, LineEffect]" = {}
+        self.trace: Optional[FrameTrace] = None
+        self.ticks = 0
+        self.frames = 0
+        self._job = None
+
+    def __contains__(self, line: str) -> bool:
+        return line in self.effects
+
+    def get(self, line: str) -> Optional[LineEffect]:
+        return self.effects.get(line)
+
+    def set(self, effect: LineEffect):
+        # pierwsza ramka od razu, w wywołaniu (potwierdzenia z DisplayEngine.flushed)
+        old = self.effects.get(effect.line)
+        if old is not None:
+            old.release(self.pool)
+        self.effects[effect.line] = effect
+        self._run()
+
+    def stop(self, line: str) -> Optional[LineEffect]:
+        effect = self.effects.pop(line, None)
+        if effect is not None:
+            effect.release(self.pool)
+            self._arm()
+        return effect
+
+    def stop_all(self):
+        for effect in self.effects.values():
+            effect.release(self.pool)
+        self.effects.clear()
+        self._arm()
+
+    def freeze(self, line: Optional[str] = None):
+        # liczniki (wszystkie albo jednej linii) zostają na tablicy jako statyczny tekst
+        now = time.monotonic_ns()
+        for key, effect in list(self.effects.items()):
+            if line is not None and key != line:
+                continue
+            payload = effect.frozen(now)
+            if payload is not None:
+                effect.release(self.pool)
+                self.effects[key] = TextEffect(key, effect.brightness, payload, markup=True, targets=effect.targets)
+        self._run()
+
+    def pace(self, base_ms: int, nbytes: int, priority: int, targets=None) -> int:
+        # strumienie o tym samym priorytecie dzielą łącze: liczone jak jeden, n razy większy
+        streams = sum(1 for e in self.effects.values() if e.stream == priority)
+        return self.pool.interval_ms(base_ms, nbytes * max(1, streams), priority, targets)
+
+    def _tick(self):
+        # wywołanie z tickera: zadanie już się wykonało, nie ma czego anulować
+        self._job = None
+        self._run()
+
+    def _run(self):
+        now = time.monotonic_ns()
+        horizon = now + _ms(COMPOSE_SLACK_MS)
+        due = [e for e in self.effects.values() if e.due_ns is not None and e.due_ns <= horizon]
+        if due:
+            self.ticks += 1
+            trace = self.trace
+            with self.pool.batch():
+                for effect in due:
+                    t0 = time.perf_counter_ns() if trace is not None else 0
+                    out = effect.frame(now, self)
+                    if out is None:
+                        continue
+                    data, priority, coalesce, targets = out
+                    if trace is not None:
+                        trace.record("build", effect.line, len(data), duration_ns=time.perf_counter_ns() - t0)
+                    self.send(data, coalesce, priority, effect.line, effect.brightness, targets)
+                    self.frames += 1
+            for effect in due:
+                if effect.finished and self.effects.get(effect.line) is effect:
+                    del self.effects[effect.line]
+                    effect.release(self.pool)
+                    if effect.expires and self.on_finished is not None:
+                        self.on_finished(effect)
+        self._arm()
+
+    def _arm(self):
+        if self._job is not None:
+            self.ticker.cancel(self._job)
+            self._job = None
+        deadlines = [e.due_ns for e in self.effects.values() if e.due_ns is not None]
+        if not deadlines:
+            return
+        delay_ms = max(0, -(-(min(deadlines) - time.monotonic_ns()) // 1_000_000))
+        self._job = self.ticker.once(delay_ms, self._tick, name="compositor")
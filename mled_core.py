@@ -0,0 +1,1076 @@
+# -*- coding: utf-8 -*-
+"""
+MLED protocol core: frames, transliteration, serial writers and scheduling.
+No tkinter here, so it can be used headless.
+"""
+
+import re
+import time
+import queue
+import logging
+import csv
+import itertools
+import functools
+import threading
+import contextlib
+import unicodedata
+from collections import OrderedDict, deque
+from typing import Optional, Callable, Iterable
+import serial
+
+log = logging.getLogger("mled")
+
+STX = 0x02
+LF  = 0x0A
+
+BAUDRATE = 9600
+BYTESIZE = serial.EIGHTBITS
+PARITY   = serial.PARITY_NONE
+STOPBITS = serial.STOPBITS_ONE
+
+LINE_CHOICES = [str(i) for i in range(1, 16)]
+BRIGHTNESS_CHOICES = ("1", "2", "3")
+MAX_PAYLOAD = 64
+
+# flagi ^rt: odliczanie w dół (jak w wersji web) i zegar rosnący liczony przez tablicę;
+# RT_COUNT_UP niepotwierdzone na sprzęcie, więc count-up domyślnie liczy host
+RT_COUNT_UP = 1
+RT_COUNT_DOWN = 2
+# co ile sekund host koryguje zegar tablicy przy count-up na tablicy (0 = wcale)
+UP_RESYNC_SECS = 30
+# tekst po odliczaniu: najwyżej tyle znaków; dłuższy niż FINISH_STATIC_MAX jest przewijany
+FINISH_TEXT_MAX = 30
+FINISH_STATIC_MAX = 8
+# odstęp kroków scrolla (ms) dla prędkości 1-3
+SCROLL_DELAYS = {1: 550, 2: 350, 3: 220}
+# scroll adaptacyjny: najkrótszy krok, zapas ponad zmierzony czas wysłania ramki,
+# wzrost przy zaległościach i powolne skracanie, gdy łącze nadąża
+ADAPT_MIN_MS = 80
+ADAPT_HEADROOM = 1.3
+ADAPT_BACKOFF = 1.25
+ADAPT_DECAY = 0.97
+# waga nowej próbki w średniej czasu wysłania (EMA)
+DRAIN_EMA = 0.2
+
+COLOR_MAP = {
+    "Default": None,
+    "Red": 1, "Green": 2, "Blue": 3, "Yellow": 4, "Magenta": 5,
+    "Cyan": 6, "White": 7, "Orange": 8, "Deep pink": 9, "Light Blue": 10,
+}
+
+# transliteracja
+BASE_MAP = {
+    'ą':'a','ć':'c','ę':'e','ł':'l','ń':'n','ó':'o','ś':'s','ż':'z','ź':'z',
+    'Ą':'A','Ć':'C','Ę':'E','Ł':'L','Ń':'N','Ó':'O','Ś':'S','Ż':'Z','Ź':'Z',
+    'ß':'ss','Æ':'AE','æ':'ae','Œ':'OE','œ':'oe'
+}
+SANITIZE_CACHE_SIZE = 512
+
+WRITE_QUEUE_SIZE = 32
+# ramki czekające w kolejce idą jednym write(), do tylu bajtów
+WRITE_BATCH_BYTES = 1024
+# zapis dłuższy niż tyle ms oznacza wolny adapter
+SLOW_WRITE_MS = 50.0
+
+# łącze: start + 8 bitów danych + stop = 10 bitów na bajt
+BITS_PER_BYTE = 10
+PRIO_TIMER, PRIO_TEXT, PRIO_SCROLL = 0, 1, 2
+# część przepustowości łącza dostępna dla danego priorytetu
+PRIO_SHARE = {PRIO_TIMER: 1.0, PRIO_TEXT: 0.9, PRIO_SCROLL: 0.75}
+MAX_STRETCH_MS = 2000
+
+# co ile sekund identyczna ramka i tak idzie na łącze (None = nigdy)
+KEEPALIVE_SECS: Optional[float] = 5.0
+# ramki wyzwalające akcję na tablicy, nigdy nie są pomijane
+COMMAND_TAGS = (b"^rt ", b"^fd ", b"^ic ", b"^sc ")
+
+# logo po połączeniu (^ic = ikona), też ramka sondy w mled_ports
+HELLO_PAYLOAD = "^ic 5 7^^cs 3^MLED"
+
+# przewijanie po stronie tablicy: jedna ramka "^sc <prędkość 1-3>^tekst" zamiast
+# strumienia z hosta; znacznik zależy od firmware, stąd flaga per tablica
+CAP_DEVICE_SCROLL = "device_scroll"
+
+# watchdog: co ile sprawdza porty, odstępy prób ponownego otwarcia (podwajane do max)
+WATCHDOG_SECS = 0.2
+RECONNECT_MIN_SECS = 0.1
+RECONNECT_MAX_SECS = 5.0
+
+CLOCK_RE = re.compile(r"^(?:(\d+):)?(\d+)(?:\.(\d{1,2}))?$")
+RT_RE = re.compile(rb"\^rt (\d+) ([0-9:.]+)\^")
+
+# ślad ramek: liczba rekordów w pierścieniu; ostatnie czasy zapisu do p99
+TRACE_SIZE = 8192
+WRITE_HISTORY = 256
+
+# ---------- frames ----------
+def build_frame(line_char: str, brightness: str, payload: str) -> bytes:
+    # linie 10-15 idą jako dwa znaki ASCII ("12"); bez separatora ramka linii 1
+    # z tekstem od cyfry 1-3 ma te same bajty co linia 11-13 (np. "1"+"1"+"2.." i "11"+"2"+"..")
+    if brightness not in BRIGHTNESS_CHOICES:
+        raise ValueError("Brightness must be 1 2 or 3")
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError("Too long. Max 64 characters")
+    b = bytearray()
+    b.append(STX)
+    b.extend(line_char.encode("ascii"))
+    b.extend(brightness.encode("ascii"))
+    b.extend(payload.encode("latin-1"))
+    b.append(LF)
+    return bytes(b)
+
+def color_tag(color_code: Optional[int]) -> str:
+    return f"^cs {color_code or 0}^"
+
+def markup_overhead(color_code: Optional[int]) -> int:
+    # znaki zajęte przez kolor (^cs 1^ = 6, ^cs 10^ = 7)
+    return 0 if color_code is None else len(color_tag(color_code))
+
+def wrap_color(text: str, color_code: Optional[int]) -> str:
+    # każda ramka zaczyna w kolorze domyślnym, więc końcowe ^cs 0^ jest zbędne
+    return text if color_code is None else color_tag(color_code) + text
+
+def markup(segments: "Iterable[tuple[str, Optional[int]]]", limit: int = MAX_PAYLOAD) -> str:
+    # Shortest markup for colored runs [(text, code)]: neighbours in the same
+    # color are merged, spaces take the color of their neighbour, a tag is
+    # written only when the color changes and there is no trailing reset.
+    # The visible text is cut so the result never exceeds limit.
+    runs = []
+    for text, code in segments:
+        if not text:
+            continue
+        if runs and (code == runs[-1][1] or not text.strip()):
+            runs[-1][0] += text
+        elif runs and not runs[-1][0].strip():
+            runs[-1] = [runs[-1][0] + text, code]
+        else:
+            runs.append([text, code])
+    out = []
+    current, room = None, limit
+    for text, code in runs:
+        tag = "" if code == current else color_tag(code)
+        if len(tag) >= room:
+            break
+        take = text[:room - len(tag)]
+        out.append(tag + take)
+        room -= len(tag) + len(take)
+        current = code
+        if len(take) < len(text):
+            break
+    return "".join(out)
+
+def cmd_rt(flags: int, fmt_text: str) -> str:
+    return f"^rt {flags} {fmt_text}^"
+
+def cmd_sc(speed: int) -> str:
+    return f"^sc {speed}^"
+
+def countdown_payload(seconds: float, color_code: Optional[int]) -> str:
+    # odliczanie liczone przez tablicę od mm:ss
+    return wrap_color(cmd_rt(RT_COUNT_DOWN, fmt_clock(seconds, False)), color_code)
+
+def finish_message(text: str) -> str:
+    return sanitize((text or "").strip())[:FINISH_TEXT_MAX]
+
+def flash_payload(text: str, color_code: Optional[int]) -> str:
+    # miganie fragmentu (^fs ... ^fe)
+    tag = "^fs 0 1^" if color_code is None else f"^fs 0 1 {color_code}^"
+    return tag + text + "^fe^"
+
+def cmd_fd(color_code: Optional[int]) -> str:
+    # miganie całej linii
+    return "^fd 0 1^" if color_code is None else f"^fd 0 1 {color_code}^"
+
+def fmt_elapsed(elapsed: float) -> str:
+    mm = int(elapsed // 60)
+    ss_full = elapsed % 60
+    ss = int(ss_full)
+    cc = int((ss_full - ss) * 100)
+    return f"{ss:02d}.{cc:02d}" if mm == 0 else f"{mm:02d}:{ss:02d}.{cc:02d}"
+
+def parse_color(value: str) -> Optional[int]:
+    # nazwa z COLOR_MAP (bez wielkości liter) albo kod 1-10
+    for name, code in COLOR_MAP.items():
+        if name.lower() == value.lower():
+            return code
+    if value.isdigit() and 1 <= int(value) <= 10:
+        return int(value)
+    raise ValueError(f"unknown color {value}")
+
+def parse_clock(text: str) -> "Optional[tuple[float, bool]]":
+    # "mm:ss", "ss.cc" albo "mm:ss.cc" -> (sekundy, z setnymi)
+    m = CLOCK_RE.match(text.strip())
+    if not m:
+        return None
+    mm, ss, cc = m.groups()
+    secs = int(mm or 0) * 60 + int(ss) + (int(cc.ljust(2, "0")) / 100.0 if cc else 0.0)
+    return secs, cc is not None
+
+def fmt_clock(secs: float, hundredths: bool) -> str:
+    secs = max(0.0, secs)
+    mm, ss = int(secs // 60), int(secs % 60)
+    if not hundredths:
+        return f"{mm:02d}:{ss:02d}"
+    cc = int((secs - int(secs)) * 100)
+    return f"{ss:02d}.{cc:02d}" if mm == 0 else f"{mm:02d}:{ss:02d}.{cc:02d}"
+
+def rearm_rt(frame: bytes, line: str, elapsed: float) -> bytes:
+    # ^rt przesunięty o czas od wysłania: odliczanie od pozostałego czasu, zegar od upływu
+    def shift(m):
+        clock = parse_clock(m.group(2).decode("ascii"))
+        if clock is None:
+            return m.group(0)
+        flags = int(m.group(1))
+        secs = clock[0] - elapsed if flags & RT_COUNT_DOWN else clock[0] + elapsed
+        return b"^rt %d %s^" % (flags, fmt_clock(secs, clock[1]).encode("ascii"))
+    out = RT_RE.sub(shift, frame)
+    # STX + linia + jasność + LF; mm:ss.cc zamiast ss.cc może nie zmieścić się w limicie
+    return out if len(out) - len(line) - 3 <= MAX_PAYLOAD else frame
+
+def plain_frame(line: str, brightness: str, s: str, code: Optional[int], prefix: str = "") -> bytes:
+    # tekst (już po sanitize) w kolorze, opcjonalnie za komendą; za długi obcinany do limitu
+    return build_frame(line, brightness, prefix + markup(((s, code),), MAX_PAYLOAD - len(prefix)))
+
+# ---------- sanitize ----------
+def _translit_char(ch: str) -> str:
+    if ch == '^':
+        return '*'
+    ch = BASE_MAP.get(ch, ch)
+    deacc = ''.join(c for c in unicodedata.normalize('NFKD', ch) if not unicodedata.combining(c))
+    return ''.join(c if 32 <= ord(c) <= 126 or 224 <= ord(c) <= 255 else '*' for c in deacc)
+
+class _TranslitTable(dict):
+    # str.translate table; znaki spoza tablicy liczone raz i zapamiętywane
+    def __missing__(self, cp: int) -> str:
+        out = self[cp] = _translit_char(chr(cp))
+        return out
+
+# Latin-1 + Latin Extended-A/B policzone z góry
+_SANITIZE_TABLE = _TranslitTable((cp, _translit_char(chr(cp))) for cp in range(0x250))
+
+@functools.lru_cache(maxsize=SANITIZE_CACHE_SIZE)
+def sanitize(text: str) -> str:
+    return text.translate(_SANITIZE_TABLE)
+
+# ---------- link budget ----------
+class LinkBudget:
+    # Bytes actually written during the last second, per priority, measured
+    # against the link capacity (baudrate / 10 bytes per second).
+    def __init__(self, baudrate: int = BAUDRATE, window: float = 1.0):
+        self.baudrate = baudrate
+        self.capacity = baudrate / BITS_PER_BYTE
+        self.window = window
+        self.frames_shed = 0
+        self._lock = threading.Lock()
+        self._log: "deque[tuple[float, int, int]]" = deque()
+        self._used = {prio: 0 for prio in PRIO_SHARE}
+
+    def wire_time(self, nbytes: int) -> float:
+        return nbytes * BITS_PER_BYTE / self.baudrate
+
+    def _expire(self, now: float):
+        while self._log and now - self._log[0][0] > self.window:
+            _, n, prio = self._log.popleft()
+            self._used[prio] -= n
+
+    def record(self, nbytes: int, priority: int = PRIO_TEXT):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._log.append((now, nbytes, priority))
+            self._used[priority] += nbytes
+
+    def used(self, above: Optional[int] = None) -> int:
+        # bajty w oknie; z `above` tylko te o wyższym priorytecie
+        with self._lock:
+            self._expire(time.monotonic())
+            return sum(n for prio, n in self._used.items() if above is None or prio < above)
+
+    def utilization(self) -> float:
+        return self.used() / (self.capacity * self.window)
+
+    def admit(self, nbytes: int, priority: int) -> bool:
+        # zrzucany jest tylko krok scrolla (następny i tak nadpisze linię); zegar
+        # zwalnia przez interval_ms, a tekst i czyszczenie zawsze idą do kolejki
+        # writera i czekają tam na łącze
+        if priority != PRIO_SCROLL:
+            return True
+        ok = self.used() + nbytes <= self.capacity * self.window * PRIO_SHARE[priority]
+        if not ok:
+            self.frames_shed += 1
+        return ok
+
+    def interval_ms(self, base_ms: int, nbytes: int, priority: int) -> int:
+        # najkrótszy odstęp >= base_ms, przy którym strumień mieści się
+        # w przepustowości pozostawionej przez wyższe priorytety
+        free = self.capacity * PRIO_SHARE[priority] - self.used(above=priority) / self.window
+        if free <= 0:
+            return MAX_STRETCH_MS
+        return int(min(MAX_STRETCH_MS, max(base_ms, 1000.0 * nbytes / free)))
+
+# ---------- frame encoder ----------
+class FrameEncoder:
+    # Frame buffer bound to one (line, brightness). STX, line and brightness
+    # are written once; encode() writes payload + LF in place and returns a
+    # memoryview that stays valid until the next encode() call.
+    __slots__ = ("line", "brightness", "_buf", "_view", "_head")
+
+    def __init__(self, line_char: str, brightness: str):
+        if brightness not in BRIGHTNESS_CHOICES:
+            raise ValueError("Brightness must be 1 2 or 3")
+        self.line = line_char
+        self.brightness = brightness
+        head = bytes([STX]) + line_char.encode("ascii") + brightness.encode("ascii")
+        self._head = len(head)
+        self._buf = bytearray(self._head + MAX_PAYLOAD + 1)
+        self._buf[:self._head] = head
+        self._view = memoryview(self._buf)
+
+    def encode(self, payload: str) -> memoryview:
+        n = len(payload)
+        if n > MAX_PAYLOAD:
+            raise ValueError("Too long. Max 64 characters")
+        end = self._head + n
+        self._buf[self._head:end] = payload.encode("latin-1")
+        self._buf[end] = LF
+        return self._view[:end + 1]
+
+# ---------- frame cache ----------
+class FrameCache:
+    # Last frame committed per (line, brightness). A byte-identical frame is
+    # dropped unless it carries a command or the keep-alive interval passed.
+    def __init__(self, keepalive: Optional[float] = KEEPALIVE_SECS):
+        self.keepalive = keepalive
+        self.frames_suppressed = 0
+        self.bytes_suppressed = 0
+        self._last: "dict[tuple[str, str], tuple[bytes, float]]" = {}
+
+    def is_duplicate(self, line: str, brightness: str, data: bytes) -> bool:
+        prev = self._last.get((line, brightness))
+        if prev is None or prev[0] != data:
+            return False
+        if any(tag in prev[0] for tag in COMMAND_TAGS):
+            return False
+        if self.keepalive is not None and time.monotonic() - prev[1] >= self.keepalive:
+            return False
+        self.frames_suppressed += 1
+        self.bytes_suppressed += len(data)
+        return True
+
+    def commit(self, line: str, brightness: str, data: bytes):
+        # nowa ramka zastępuje zawartość linii przy każdej jasności
+        for bright in "123":
+            self._last.pop((line, bright), None)
+        self._last[(line, brightness)] = (data, time.monotonic())
+
+    def reset(self):
+        self._last.clear()
+
+    def has_line(self, line: str) -> bool:
+        return any(key[0] == line for key in self._last)
+
+    def snapshot(self) -> "list[tuple[str, str, bytes, float]]":
+        # (linia, jasność, ramka, czas commit) - ostatnia treść każdej linii
+        return [(line, bright, data, ts) for (line, bright), (data, ts) in list(self._last.items())]
+
+# ---------- frame trace ----------
+class FrameTrace:
+    # Fixed-size ring of per-frame records, filled by the writer threads, the
+    # port pool, the engine and the scheduler. Nothing records anything
+    # unless a FrameTrace is attached, so with tracing off the hot path pays
+    # one `is None` check. Record kinds:
+    #   write  frame left the writer: wait = time in queue, duration = write()
+    #   drop   frame evicted from a full queue
+    #   dup    frame suppressed by the frame cache
+    #   shed   frame refused by the link budget
+    #   send   PortPool.send call (fan-out, dedupe, copy, submit)
+    #   build  frame built by the engine
+    #   tick   scheduler callback: wait = lateness, duration = callback time
+    FIELDS = ("t_ms", "kind", "name", "bytes", "wait_ms", "duration_ms", "link")
+
+    def __init__(self, size: int = TRACE_SIZE):
+        self.size = size
+        self.t0 = time.perf_counter_ns()
+        self._buf: "list[Optional[tuple]]" = [None] * size
+        # next() na itertools.count jest atomowe, wątki writerów nie gubią slotów
+        self._seq = itertools.count()
+        self._n = 0
+
+    def record(self, kind: str, name: str, nbytes: int = 0, wait_ns: int = 0, duration_ns: int = 0,
+               link: str = ""):
+        i = next(self._seq)
+        self._buf[i % self.size] = (time.perf_counter_ns(), kind, name, nbytes, wait_ns, duration_ns, link)
+        self._n = max(self._n, i + 1)
+
+    def __len__(self) -> int:
+        return min(self._n, self.size)
+
+    def records(self) -> "list[tuple]":
+        n, size = self._n, self.size
+        recs = self._buf[:n] if n <= size else self._buf[n % size:] + self._buf[:n % size]
+        return sorted((r for r in recs if r is not None), key=lambda r: r[0])
+
+    def clear(self):
+        self._buf = [None] * self.size
+        self._seq = itertools.count()
+        self._n = 0
+
+    def export(self, path: str) -> int:
+        # CSV, czasy w ms od włączenia śladu
+        recs = self.records()
+        with open(path, "w", newline="") as f:
+            out = csv.writer(f)
+            out.writerow(self.FIELDS)
+            for t, kind, name, nbytes, wait, dur, link in recs:
+                out.writerow((f"{(t - self.t0) / 1e6:.3f}", kind, name, nbytes,
+                              f"{wait / 1e6:.3f}", f"{dur / 1e6:.3f}", link))
+        return len(recs)
+
+# ---------- serial writer ----------
+class FrameDropped(Exception):
+    # ramka nie trafiła na łącze (kolejka pełna albo port zamknięty)
+    pass
+
+class SerialWriter(threading.Thread):
+    # Owns the serial.Serial handle. Frames come in through a bounded queue;
+    # a frame submitted with the key of a still-queued frame replaces it in
+    # place (latest wins), so stale timer/scroll frames never pile up.
+    # Everything queued when the thread wakes goes out in one write();
+    # hold()/release() keep it asleep while a tick queues several lines.
+    def __init__(self, port: serial.Serial, maxsize: int = WRITE_QUEUE_SIZE,
+                 budget: Optional[LinkBudget] = None):
+        super().__init__(name=f"mled-writer-{port.port}", daemon=True)
+        self.port = port
+        self.maxsize = maxsize
+        self.budget = budget
+        self.errors: "queue.SimpleQueue[Exception]" = queue.SimpleQueue()
+        self.trace: Optional[FrameTrace] = None
+        self._cond = threading.Condition()
+        # klucz -> (ramka, priorytet, oczekujący na flush, linia, czas zgłoszenia ns)
+        self._pending: "OrderedDict[object, tuple[bytes, int, Optional[list], str, int]]" = OrderedDict()
+        self._seq = 0
+        self._closing = False
+        self._held = 0
+
+        # liczniki
+        self.frames_written = 0
+        self.bytes_written = 0
+        self.frames_coalesced = 0
+        self.frames_dropped = 0
+        self.writes = 0
+        self.last_write_ms = 0.0
+        self.max_write_ms = 0.0
+        self._write_ms_total = 0.0
+        self.recent_ms: "deque[float]" = deque(maxlen=WRITE_HISTORY)
+        # z measure_drain każdy zapis czeka na flush(); drain_ms = write + opróżnienie bufora
+        self.measure_drain = False
+        self.drain_ms = 0.0
+        # ramka zdjęta z kolejki, ale jeszcze nie wysłana
+        self.busy = False
+        self.last_error: Optional[Exception] = None
+        self.consecutive_errors = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    @property
+    def avg_write_ms(self) -> float:
+        return self._write_ms_total / self.writes if self.writes else 0.0
+
+    @property
+    def p99_write_ms(self) -> float:
+        with self._cond:
+            return _p99(self.recent_ms)
+
+    def counters(self) -> dict:
+        # spójny odczyt z innego wątku (GUI); liczniki zmieniane są pod _cond
+        with self._cond:
+            return {"frames": self.frames_written, "writes": self.writes, "bytes": self.bytes_written,
+                    "dropped": self.frames_dropped, "coalesced": self.frames_coalesced,
+                    "queue": len(self._pending), "write_ms": self.last_write_ms,
+                    "errors": self.consecutive_errors, "recent_ms": list(self.recent_ms)}
+
+    def submit(self, data: bytes, key=None, priority: int = PRIO_TEXT,
+               on_done: Optional[Callable] = None, line: str = "") -> bool:
+        # on_done(None) po zapisie i flush() portu, on_done(exc) gdy ramka przepadła;
+        # ramka zastąpiona nowszą dziedziczy oczekujących (liczy się treść na tablicy)
+        waiters = [on_done] if on_done is not None else None
+        with self._cond:
+            if self._closing:
+                if on_done is not None:
+                    on_done(FrameDropped("port closed"))
+                return False
+            if key is None:
+                self._seq += 1
+                key = ("seq", self._seq)
+            elif key in self._pending:
+                # czas w kolejce liczony od pierwszej, zastąpionej ramki
+                _, _, old, _, queued = self._pending[key]
+                if old:
+                    waiters = old + (waiters or [])
+                self._pending[key] = (data, priority, waiters, line, queued)
+                self.frames_coalesced += 1
+                return True
+            if len(self._pending) >= self.maxsize:
+                # najpierw najstarszy krok scrolla, tekst i zegar tylko gdy nie ma innej ramki
+                victim = next((k for k, entry in self._pending.items() if entry[1] == PRIO_SCROLL),
+                              next(iter(self._pending)))
+                lost_data, _, lost, lost_line, _ = self._pending.pop(victim)
+                self.frames_dropped += 1
+                if self.trace is not None:
+                    self.trace.record("drop", lost_line, len(lost_data), link=self.port.port)
+                _notify(lost, FrameDropped("write queue full"))
+            self._pending[key] = (data, priority, waiters, line, time.perf_counter_ns())
+            if not self._held:
+                self._cond.notify()
+        return True
+
+    def hold(self):
+        with self._cond:
+            self._held += 1
+
+    def release(self):
+        with self._cond:
+            self._held -= 1
+            if not self._held and self._pending:
+                self._cond.notify()
+
+    def _take_batch(self) -> list:
+        # najstarsze ramki z kolejki, razem nie więcej niż WRITE_BATCH_BYTES (co najmniej jedna)
+        pending = self._pending
+        batch = [pending.popitem(last=False)[1]]
+        size = len(batch[0][0])
+        while pending:
+            nxt = next(iter(pending.values()))
+            size += len(nxt[0])
+            if size > WRITE_BATCH_BYTES:
+                break
+            batch.append(pending.popitem(last=False)[1])
+        return batch
+
+    def run(self):
+        while True:
+            with self._cond:
+                while (not self._pending or self._held) and not self._closing:
+                    self._cond.wait()
+                if self._closing:
+                    return
+                batch = self._take_batch()
+                self.busy = True
+            data = batch[0][0] if len(batch) == 1 else b"".join(entry[0] for entry in batch)
+            waiters = [cb for entry in batch for cb in entry[2] or ()]
+            t0 = time.perf_counter_ns()
+            measure = self.measure_drain
+            try:
+                self.port.write(data)
+                if waiters or measure:
+                    # do końca wysłania z bufora (potwierdzenie albo pomiar łącza)
+                    self.port.flush()
+            except Exception as e:
+                self.busy = False
+                with self._cond:
+                    self.last_error = e
+                    self.consecutive_errors += 1
+                self.errors.put(e)
+                _notify(waiters, e)
+                continue
+            t1 = time.perf_counter_ns()
+            self.busy = False
+            dt = (t1 - t0) / 1e6
+            for frame, priority, _, line, queued in batch:
+                if self.trace is not None:
+                    self.trace.record("write", line, len(frame), t0 - queued, t1 - t0, self.port.port)
+                if self.budget is not None:
+                    self.budget.record(len(frame), priority)
+            with self._cond:
+                self.consecutive_errors = 0
+                self.writes += 1
+                self.frames_written += len(batch)
+                self.bytes_written += len(data)
+                self.last_write_ms = dt
+                self.max_write_ms = max(self.max_write_ms, dt)
+                self._write_ms_total += dt
+                self.recent_ms.append(dt)
+            if measure:
+                self.drain_ms = dt if not self.drain_ms else self.drain_ms + DRAIN_EMA * (dt - self.drain_ms)
+            _notify(waiters, None)
+
+    def close(self, timeout: float = 1.0):
+        with self._cond:
+            self._closing = True
+            for entry in self._pending.values():
+                _notify(entry[2], FrameDropped("port closed"))
+            self._pending.clear()
+            self._cond.notify()
+        self.join(timeout)
+        if self.port.is_open:
+            self.port.close()
+
+def _p99(samples) -> float:
+    recent = sorted(samples)
+    return recent[min(len(recent) - 1, int(0.99 * len(recent)))] if recent else 0.0
+
+def _notify(waiters, error: Optional[Exception]):
+    for cb in waiters or ():
+        try:
+            cb(error)
+        except Exception:
+            log.exception("write callback failed")
+
+_ALREADY_SHOWN = FrameDropped("duplicate")
+
+class _FanOut:
+    # Jedno on_done dla ramki wysłanej na kilka tablic: wywołane raz,
+    # gdy wszystkie odpowiedzą, z pierwszym błędem (albo None).
+    __slots__ = ("remaining", "error", "on_done", "_lock")
+
+    def __init__(self, count: int, on_done: Callable):
+        self.remaining = count
+        self.error: Optional[Exception] = None
+        self.on_done = on_done
+        self._lock = threading.Lock()
+
+    def __call__(self, error: Optional[Exception]):
+        with self._lock:
+            if error is not None and self.error is None:
+                self.error = error
+            self.remaining -= 1
+            if self.remaining:
+                return
+        self.on_done(self.error)
+
+
+# ---------- scroll ring ----------
+class ScrollRing:
+    # Every rotation of a marquee as a ready-to-write frame, per color code.
+    # make_frame(line, brightness, text, code) builds one frame; the ring is
+    # rebuilt only when line or brightness change or a new color shows up.
+    def __init__(self, text: str, make_frame: Callable[[str, str, str, Optional[int]], bytes], window: int = 64):
+        win = min(len(text), window)
+        doubled = text * 2
+        self.texts = [doubled[k:k + win] for k in range(1, len(text) + 1)]
+        self.make_frame = make_frame
+        self.line: Optional[str] = None
+        self.brightness: Optional[str] = None
+        self.frames: "dict[Optional[int], list[bytes]]" = {}
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def build(self, line: str, brightness: str, codes):
+        self.line, self.brightness = line, brightness
+        self.frames = {code: [self.make_frame(line, brightness, t, code) for t in self.texts] for code in codes}
+
+    def frame(self, idx: int, line: str, brightness: str, code: Optional[int]) -> bytes:
+        if line != self.line or brightness != self.brightness:
+            self.build(line, brightness, self.frames.keys() | {code})
+        elif code not in self.frames:
+            self.frames[code] = [self.make_frame(line, brightness, t, code) for t in self.texts]
+        return self.frames[code][idx]
+
+# ---------- port pool ----------
+def open_port(name: str, write_timeout: float = 1.0) -> serial.Serial:
+    # port COM/tty albo URL pyserial (loop:// do testów), parametry tablicy
+    return serial.serial_for_url(name, baudrate=BAUDRATE, bytesize=BYTESIZE, parity=PARITY,
+                                 stopbits=STOPBITS, timeout=0.2, write_timeout=write_timeout)
+
+class DisplayLink:
+    # One board: its serial port, writer thread, link budget and frame cache.
+    def __init__(self, name: str, port: serial.Serial):
+        self.name = name
+        self.port = port
+        # możliwości tablicy (CAP_*), ustawiane przez użytkownika albo sondę
+        self.caps: "set[str]" = set()
+        self.budget = LinkBudget()
+        self.cache = FrameCache()
+        self.writer = SerialWriter(port, budget=self.budget)
+        self.writer.start()
+
+    @property
+    def is_open(self) -> bool:
+        return self.port.is_open and self.writer.is_alive()
+
+    def refuse(self, line: str, brightness: str, data, priority: int) -> Optional[Exception]:
+        # powód odrzucenia ramki: duplikat (już na tablicy) albo brak budżetu dla scrolla
+        if self.cache.is_duplicate(line, brightness, data):
+            return _ALREADY_SHOWN
+        if not self.budget.admit(len(data), priority):
+            return FrameDropped("link busy")
+        return None
+
+    def submit(self, data: bytes, line: str, brightness: str, coalesce: bool, priority: int,
+               on_done: Optional[Callable] = None) -> bool:
+        self.cache.commit(line, brightness, data)
+        # nowsza ramka dla tej samej linii zastępuje starą w kolejce
+        return self.writer.submit(data, line if coalesce else None, priority, on_done, line)
+
+    def alive(self) -> bool:
+        # błąd zapisu albo odłączone urządzenie (zapytanie o bufor rzuca wyjątek)
+        if not self.is_open or self.writer.consecutive_errors:
+            return False
+        if isinstance(self.port, serial.Serial):
+            try:
+                self.port.out_waiting
+            except (serial.SerialException, OSError):
+                return False
+        return True
+
+    def out_waiting(self) -> int:
+        # bajty jeszcze w buforze sterownika; tylko prawdziwy port (loop:// trzyma wszystko)
+        if not isinstance(self.port, serial.Serial):
+            return 0
+        try:
+            return self.port.out_waiting
+        except (serial.SerialException, OSError):
+            return 0
+
+    def health(self, counters: Optional[dict] = None) -> str:
+        c = counters or self.writer.counters()
+        if not self.is_open or c["errors"]:
+            return "error"
+        if c["queue"] > self.writer.maxsize // 2 or c["write_ms"] > SLOW_WRITE_MS:
+            return "slow"
+        return "ok"
+
+    def close(self):
+        self.writer.close()
+
+class PortPool:
+    # Several boards on separate adapters. Every link has its own writer
+    # thread, so one stalled adapter only backs up its own queue.
+    def __init__(self):
+        self.links: "OrderedDict[str, DisplayLink]" = OrderedDict()
+        self.trace: Optional[FrameTrace] = None
+        # zapis sesji (mled_capture.CaptureWriter): każde wywołanie send
+        self.capture = None
+        # links zmieniają pętla silnika (open w executorze) i watchdog; snapshot() czyta z GUI
+        self._lock = threading.Lock()
+
+    def set_trace(self, trace: Optional[FrameTrace]):
+        self.trace = trace
+        for link in self.links.values():
+            link.writer.trace = trace
+
+    def __len__(self) -> int:
+        return len(self.links)
+
+    def _new_link(self, name: str) -> DisplayLink:
+        link = DisplayLink(name, open_port(name))
+        link.writer.trace = self.trace
+        return link
+
+    def open(self, name: str) -> DisplayLink:
+        if name in self.links:
+            return self.links[name]
+        link = self._new_link(name)
+        with self._lock:
+            self.links[name] = link
+        return link
+
+    def reopen(self, old: DisplayLink) -> Optional[DisplayLink]:
+        # nowy port w miejsce martwego; ostatnia ramka każdej linii idzie jeszcze raz,
+        # ^rt przesunięty o czas, który minął. None, gdy link zamknięto w międzyczasie
+        link = self._new_link(old.name)
+        if self.links.get(old.name) is not old:
+            link.close()
+            return None
+        link.caps = old.caps
+        link.writer.measure_drain = old.writer.measure_drain
+        with self._lock:
+            self.links[old.name] = link
+        now = time.monotonic()
+        for line, brightness, data, ts in sorted(old.cache.snapshot(), key=lambda e: e[3]):
+            # linia nadpisana już po podmianie ma świeższą treść
+            if link.cache.has_line(line):
+                continue
+            if b"^rt " in data:
+                data = rearm_rt(data, line, now - ts)
+            link.submit(data, line, brightness, True, PRIO_TIMER)
+        return link
+
+    def close(self, name: str):
+        with self._lock:
+            link = self.links.pop(name, None)
+        if link is not None:
+            link.close()
+
+    def close_all(self):
+        for name in list(self.links):
+            self.close(name)
+
+    def select(self, targets=None) -> "list[DisplayLink]":
+        if targets is None:
+            return list(self.links.values())
+        return [self.links[t] for t in targets if t in self.links]
+
+    @contextlib.contextmanager
+    def batch(self):
+        # ramki wysłane w bloku idą na każdą tablicę jednym write()
+        writers = [link.writer for link in self.links.values()]
+        for w in writers:
+            w.hold()
+        try:
+            yield
+        finally:
+            for w in writers:
+                w.release()
+
+    def send(self, data, line: str, brightness: str, coalesce: bool = True,
+             priority: int = PRIO_TEXT, targets=None, on_done: Optional[Callable] = None) -> int:
+        # on_done(error) raz, gdy ramka zeszła na wszystkie wybrane tablice;
+        # duplikat jest od razu potwierdzony, ramka zrzucona przez budżet to błąd
+        if self.capture is not None:
+            self.capture.record(data, line, priority, coalesce)
+        trace = self.trace
+        t0 = time.perf_counter_ns() if trace is not None else 0
+        links = self.select(targets)
+        done = _FanOut(len(links), on_done) if on_done is not None and links else None
+        if on_done is not None and not links:
+            on_done(FrameDropped("no port selected"))
+        sent = 0
+        frame = None
+        for link in links:
+            refused = link.refuse(line, brightness, data, priority)
+            if refused is not None:
+                if trace is not None:
+                    trace.record("dup" if refused is _ALREADY_SHOWN else "shed", line, len(data), link=link.name)
+                if done is not None:
+                    done(None if refused is _ALREADY_SHOWN else refused)
+                continue
+            # memoryview z FrameEncoder jest nadpisywany przy następnej ramce;
+            # jedyna kopia powstaje tutaj, przy przekazaniu do writerów
+            if frame is None:
+                frame = data if isinstance(data, bytes) else bytes(data)
+            sent += link.submit(frame, line, brightness, coalesce, priority, done)
+        if trace is not None:
+            trace.record("send", line, len(data), duration_ns=time.perf_counter_ns() - t0)
+        return sent
+
+    def set_cap(self, cap: str, enabled: bool, targets=None):
+        for link in self.select(targets):
+            if enabled:
+                link.caps.add(cap)
+            else:
+                link.caps.discard(cap)
+
+    def split(self, cap: str, targets=None) -> "tuple[list[str], list[str]]":
+        # wybrane tablice: (z możliwością, bez niej)
+        links = self.select(targets)
+        return ([l.name for l in links if cap in l.caps], [l.name for l in links if cap not in l.caps])
+
+    def measure_drain(self, enabled: bool, targets=None):
+        for link in self.select(targets):
+            link.writer.measure_drain = enabled
+            if not enabled:
+                link.writer.drain_ms = 0.0
+
+    def drain_ms(self, targets=None) -> float:
+        # najwolniejsza z wybranych tablic
+        return max((link.writer.drain_ms for link in self.select(targets)), default=0.0)
+
+    def backlog(self, targets=None) -> int:
+        # ramki w kolejce + ta w trakcie wysyłania + niewysłane bajty w sterowniku
+        return max((link.writer.queue_depth + link.writer.busy + (link.out_waiting() > 0)
+                    for link in self.select(targets)), default=0)
+
+    def interval_ms(self, base_ms: int, nbytes: int, priority: int, targets=None) -> int:
+        return max((link.budget.interval_ms(base_ms, nbytes, priority) for link in self.select(targets)),
+                   default=base_ms)
+
+    def health(self) -> "dict[str, dict]":
+        return self.snapshot()["health"]
+
+    def counters(self) -> dict:
+        return self.snapshot()["counters"]
+
+    def snapshot(self) -> dict:
+        # stan tablic i sumy liczników (do temp w GUI) w jednym odczycie pod blokadą,
+        # bezpieczne z każdego wątku
+        with self._lock:
+            links = list(self.links.values())
+            per = [(link, link.writer.counters()) for link in links]
+        health = {link.name: {"state": link.health(c), "queue": c["queue"], "write_ms": c["write_ms"],
+                              "utilization": link.budget.utilization(), "errors": c["errors"]}
+                  for link, c in per}
+        counters = {"frames": sum(c["frames"] for _, c in per),
+                    "writes": sum(c["writes"] for _, c in per),
+                    "bytes": sum(c["bytes"] for _, c in per),
+                    "dropped": sum(c["dropped"] + link.budget.frames_shed for link, c in per),
+                    "suppressed": sum(c["coalesced"] + link.cache.frames_suppressed for link, c in per),
+                    "p99_write_ms": max((_p99(c["recent_ms"]) for _, c in per), default=0.0)}
+        return {"health": health, "counters": counters}
+
+# ---------- watchdog ----------
+class LinkWatchdog(threading.Thread):
+    # Checks every link of the pool each WATCHDOG_SECS. A link with a failed
+    # write or a vanished device is closed and reopened with backoff; on
+    # success PortPool.reopen replays the last frame of every line.
+    # events: ("lost", name, error) and ("restored", name, outage ms).
+    def __init__(self, pool: PortPool, interval: float = WATCHDOG_SECS):
+        super().__init__(name="mled-watchdog", daemon=True)
+        self.pool = pool
+        self.interval = interval
+        self.events: "queue.SimpleQueue[tuple]" = queue.SimpleQueue()
+        # nazwa -> (martwy link, czas utraty, następna próba, odstęp)
+        self.down: "dict[str, list]" = {}
+        self.reconnects = 0
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            now = time.monotonic()
+            for name, link in list(self.pool.links.items()):
+                if name not in self.down and not link.alive():
+                    self._lost(name, link, now)
+            for name, state in list(self.down.items()):
+                if now >= state[2]:
+                    self._retry(name, state)
+
+    def _lost(self, name: str, link: DisplayLink, now: float):
+        error = link.writer.last_error or FrameDropped("device gone")
+        log.warning("%s lost: %s", name, error)
+        # zamknięcie zwalnia urządzenie (Windows nie da otworzyć go drugi raz);
+        # link zostaje w puli, więc ramki wysłane w czasie przerwy trafiają do jego cache
+        try:
+            link.close()
+        except (serial.SerialException, OSError):
+            pass
+        self.down[name] = [link, now, now + RECONNECT_MIN_SECS, RECONNECT_MIN_SECS]
+        self.events.put(("lost", name, error))
+
+    def _retry(self, name: str, state: list):
+        old, since, _, delay = state
+        if self.pool.links.get(name) is not old:
+            del self.down[name]
+            return
+        try:
+            link = self.pool.reopen(old)
+        except (serial.SerialException, OSError, ValueError) as e:
+            delay = min(RECONNECT_MAX_SECS, delay * 2)
+            state[2:] = [time.monotonic() + delay, delay]
+            log.debug("%s reopen failed: %s", name, e)
+            return
+        del self.down[name]
+        if link is None:
+            return
+        self.reconnects += 1
+        outage = (time.monotonic() - since) * 1000.0
+        log.info("%s restored after %.0f ms", name, outage)
+        self.events.put(("restored", name, outage))
+
+    def stop(self):
+        self._halt.set()
+        if self.is_alive():
+            self.join(1.0)
+
+# ---------- tick scheduler ----------
+class _Job:
+    __slots__ = ("id", "name", "callback", "deadline", "period")
+
+    def __init__(self, job_id: int, name: str, callback: Callable, deadline: int, period: int):
+        self.id = job_id
+        self.name = name
+        self.callback = callback
+        self.deadline = deadline
+        self.period = period
+
+class TickScheduler:
+    # Periodic and one-shot jobs on absolute time.monotonic_ns() deadlines,
+    # driven by a single after()-style timer. A periodic job that fell behind
+    # skips the ticks it missed instead of firing them in a burst.
+    def __init__(self, after: Callable, after_cancel: Callable, history: int = 2000):
+        self._after = after
+        self._after_cancel = after_cancel
+        self._history = history
+        self._jobs: "dict[int, _Job]" = {}
+        self._ids = itertools.count(1)
+        self._handle = None
+        self._armed_for = 0
+        self.trace: Optional[FrameTrace] = None
+        self.lateness: "dict[str, deque[int]]" = {}
+        self.skipped: "dict[str, int]" = {}
+
+    def every(self, period_ms: int, callback: Callable, name: str = "job", first_ms: int = 0) -> int:
+        return self._add(name, callback, first_ms, period_ms * 1_000_000)
+
+    def once(self, delay_ms: int, callback: Callable, name: str = "job") -> int:
+        return self._add(name, callback, delay_ms, 0)
+
+    def _add(self, name: str, callback: Callable, delay_ms: int, period_ns: int) -> int:
+        job = _Job(next(self._ids), name, callback, time.monotonic_ns() + delay_ms * 1_000_000, period_ns)
+        self._jobs[job.id] = job
+        self.lateness.setdefault(name, deque(maxlen=self._history))
+        self.skipped.setdefault(name, 0)
+        self._arm()
+        return job.id
+
+    def set_period(self, job_id: Optional[int], period_ms: int):
+        job = self._jobs.get(job_id)
+        if job is None or not job.period:
+            return
+        period = period_ms * 1_000_000
+        job.deadline += period - job.period
+        job.period = period
+        self._arm(force=True)
+
+    def cancel(self, job_id: Optional[int]):
+        job = self._jobs.pop(job_id, None)
+        if job is not None and job.period:
+            self.log_stats(job.name)
+        self._arm(force=True)
+
+    def _arm(self, force: bool = False):
+        if not self._jobs:
+            if self._handle is not None:
+                self._after_cancel(self._handle)
+                self._handle = None
+            return
+        nxt = min(j.deadline for j in self._jobs.values())
+        if self._handle is not None:
+            if not force and self._armed_for <= nxt:
+                return
+            self._after_cancel(self._handle)
+        # zaokrąglenie w górę, żeby nie obudzić się przed terminem
+        delay_ms = max(0, -(-(nxt - time.monotonic_ns()) // 1_000_000))
+        self._armed_for = nxt
+        self._handle = self._after(delay_ms, self._run)
+
+    def _run(self):
+        self._handle = None
+        try:
+            now = time.monotonic_ns()
+            due = sorted((j for j in self._jobs.values() if j.deadline <= now), key=lambda j: j.deadline)
+            for job in due:
+                if job.id not in self._jobs:
+                    continue  # anulowane przez wcześniejszy callback
+                late = time.monotonic_ns() - job.deadline
+                self.lateness[job.name].append(late)
+                if job.period:
+                    missed = late // job.period
+                    self.skipped[job.name] += missed
+                    job.deadline += (missed + 1) * job.period
+                else:
+                    del self._jobs[job.id]
+                if self.trace is None:
+                    job.callback()
+                else:
+                    t0 = time.perf_counter_ns()
+                    job.callback()
+                    self.trace.record("tick", job.name, 0, late, time.perf_counter_ns() - t0)
+        finally:
+            self._arm(force=True)
+
+    def stats(self, name: str) -> dict:
+        samples = sorted(self.lateness.get(name, ()))
+        if not samples:
+            return {"ticks": 0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0, "skipped": self.skipped.get(name, 0)}
+        def pct(q): return samples[min(len(samples) - 1, int(q * len(samples)))] / 1e6
+        return {"ticks": len(samples), "p50_ms": pct(0.50), "p99_ms": pct(0.99),
+                "max_ms": samples[-1] / 1e6, "skipped": self.skipped[name]}
+
+    def log_stats(self, name: str):
+        st = self.stats(name)
+        if st["ticks"]:
+            log.info("%s: %d ticks, late p50 %.1f ms, p99 %.1f ms, max %.1f ms, %d skipped",
+                     name, st["ticks"], st["p50_ms"], st["p99_ms"], st["max_ms"], st["skipped"])
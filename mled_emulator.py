@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Virtual MLED display on a pseudo-terminal, for testing without hardware
+python3 mled_emulator.py [--baud 9600] [--latency-ms 5] [--line-width 1|2] [--show]
+
+Prints the pty path; open it in the terminal (Port field) or in mled_server.
+--line-width must match the sender: 2 for the Python tools (lines 10-15 as
+two digits, build_frame), 1 for MLED.html (one line byte). POSIX only (os.openpty).
+"""
+
+import os
+import re
+import sys
+import time
+import tty
+import select
+import argparse
+import threading
+from collections import deque
+from typing import Optional, Callable
+
+from mled_core import (
+    STX, LF, BAUDRATE, BITS_PER_BYTE, MAX_PAYLOAD, LINE_CHOICES, RT_COUNT_DOWN, SCROLL_DELAYS,
+    parse_clock, fmt_clock,
+)
+
+BRIGHT_BYTES = b"123"
+# STX + dwa znaki linii + jasność + payload + LF
+MAX_FRAME = 1 + 2 + 1 + MAX_PAYLOAD + 1
+# bajty pola linii u nadawcy
+LINE_WIDTHS = (1, 2)
+TAG_RE = re.compile(r"\^(cs|rt|fs|fe|fd|ic|sc)\b([^^]*)\^")
+
+# ---------- frames ----------
+class FrameParser:
+    # Byte stream -> (line, brightness, payload). Bytes before STX and frames
+    # longer than MAX_FRAME are discarded and counted as errors. line_width
+    # is the sender's line field, see split_frame.
+    def __init__(self, line_width: int = 2):
+        if line_width not in LINE_WIDTHS:
+            raise ValueError("line width must be 1 or 2")
+        self._buf = bytearray()
+        self.errors = 0
+        self.line_width = line_width
+
+    def feed(self, data: bytes) -> "list[tuple[str, str, bytes]]":
+        buf = self._buf
+        buf.extend(data)
+        out = []
+        while buf:
+            start = buf.find(STX)
+            if start < 0:
+                self.errors += 1
+                buf.clear()
+                break
+            if start:
+                self.errors += 1
+                del buf[:start]
+            end = buf.find(LF)
+            if end < 0:
+                if len(buf) > MAX_FRAME:
+                    self.errors += 1
+                    del buf[:1]
+                    continue
+                break
+            frame = bytes(buf[1:end])
+            del buf[:end + 1]
+            parsed = split_frame(frame, self.line_width)
+            if parsed is None:
+                self.errors += 1
+            else:
+                out.append(parsed)
+        return out
+
+def split_frame(frame: bytes, line_width: int = 2) -> "Optional[tuple[str, str, bytes]]":
+    # line_width 1: jeden bajt linii (MLED.html wysyła line.charCodeAt(0), więc 10-15 idą jako "1");
+    # line_width 2: linie 10-15 to dwa znaki (build_frame), "1" + "0..5" + jasność czytamy
+    # jako linię dwucyfrową. Ramka linii 1 z tekstem od cyfry 1-3 wygląda wtedy tak samo
+    # jak linia 11-13 (np. "1" "1" "2nd" = linia 11, jasność 2) - format tego nie rozróżnia
+    if line_width == 2 and len(frame) >= 3 and frame[0:1] == b"1" \
+            and frame[1:2] in (b"0", b"1", b"2", b"3", b"4", b"5") and frame[2] in BRIGHT_BYTES:
+        line, rest = frame[:2], frame[2:]
+    else:
+        line, rest = frame[:1], frame[1:]
+    if not rest or rest[0] not in BRIGHT_BYTES:
+        return None
+    line = line.decode("ascii", "replace")
+    if line not in LINE_CHOICES or len(rest) - 1 > MAX_PAYLOAD:
+        return None
+    return line, chr(rest[0]), rest[1:]
+
+# ---------- markup ----------
+class Segment:
+    __slots__ = ("text", "color", "flash", "timer")
+
+    def __init__(self, text: str = "", color: Optional[int] = None, flash: bool = False, timer=None):
+        self.text = text
+        self.color = color
+        self.flash = flash
+        # (flags, start secs, with hundredths, t0) dla ^rt
+        self.timer = timer
+
+    def render(self, now: float) -> str:
+        if self.timer is None:
+            return self.text
+        flags, base, cc, t0 = self.timer
+        elapsed = now - t0
+        return fmt_clock(base - elapsed if flags & RT_COUNT_DOWN else base + elapsed, cc)
+
+class LineState:
+    # Model jednej linii: segmenty z kolorem/miganiem, ^fd, ^ic i liczniki.
+    def __init__(self, line: str):
+        self.line = line
+        self.brightness = "1"
+        self.payload = b""
+        self.segments: "list[Segment]" = []
+        self.flash_line: Optional[tuple] = None
+        self.icon: Optional[tuple] = None
+        # ^sc: prędkość przewijania po stronie tablicy
+        self.scroll: Optional[int] = None
+        self.frames = 0
+        self.updated = 0.0
+
+    def apply(self, brightness: str, payload: bytes, now: float) -> int:
+        # zwraca liczbę nieznanych/błędnych znaczników
+        self.brightness = brightness
+        self.payload = payload
+        self.frames += 1
+        self.updated = now
+        text = payload.decode("latin-1")
+        segments, bad = [], 0
+        color, flash = None, False
+        flash_line = icon = scroll = None
+        pos = 0
+        for m in TAG_RE.finditer(text):
+            if m.start() > pos:
+                segments.append(Segment(text[pos:m.start()], color, flash))
+            pos = m.end()
+            tag, args = m.group(1), m.group(2).split()
+            if tag == "cs":
+                code = _num(args, 0)
+                color = None if not code else code
+            elif tag == "rt":
+                clock = parse_clock(args[1]) if len(args) >= 2 else None
+                if clock is None:
+                    bad += 1
+                    continue
+                segments.append(Segment("", color, flash, (_num(args, 0) or 0, clock[0], clock[1], now)))
+            elif tag == "fs":
+                flash = True
+                if len(args) >= 3:
+                    color = _num(args, 2)
+            elif tag == "fe":
+                flash = False
+            elif tag == "fd":
+                flash_line = tuple(_num(args, i) for i in range(len(args)))
+            elif tag == "ic":
+                icon = tuple(_num(args, i) for i in range(len(args)))
+            elif tag == "sc":
+                scroll = _num(args, 0)
+        if pos < len(text):
+            segments.append(Segment(text[pos:], color, flash))
+        bad += sum(seg.text.count("^") for seg in segments)
+        self.segments = segments
+        self.flash_line = flash_line
+        self.icon = icon
+        self.scroll = scroll
+        return bad
+
+    def text(self, now: Optional[float] = None) -> str:
+        now = time.monotonic() if now is None else now
+        text = "".join(seg.render(now) for seg in self.segments)
+        if self.scroll and text:
+            # przewijanie jak host: tekst + 3 spacje, jeden znak na krok
+            ring = text + "   "
+            k = int((now - self.updated) * 1000 / SCROLL_DELAYS.get(self.scroll, SCROLL_DELAYS[1])) % len(ring)
+            text = (ring * 2)[k:k + len(ring)]
+        return text
+
+def _num(args, idx) -> Optional[int]:
+    try:
+        return int(args[idx])
+    except (IndexError, ValueError):
+        return None
+
+class DisplayModel:
+    # Zawartość wszystkich 15 linii; apply() na każdą odebraną ramkę.
+    def __init__(self):
+        self.lines = {line: LineState(line) for line in LINE_CHOICES}
+        self.markup_errors = 0
+        self._lock = threading.Lock()
+
+    def apply(self, line: str, brightness: str, payload: bytes, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.markup_errors += self.lines[line].apply(brightness, payload, now)
+
+    def text(self, line: str) -> str:
+        with self._lock:
+            return self.lines[line].text()
+
+    def snapshot(self) -> "dict[str, str]":
+        now = time.monotonic()
+        with self._lock:
+            return {line: st.text(now) for line, st in self.lines.items() if st.frames}
+
+# ---------- emulator ----------
+class Emulator:
+    # Reads the master side of a pty, paces it like a 9600 baud link (optional)
+    # and applies each frame to the model after ingest_latency seconds.
+    # Per-frame receive/apply times are kept for throughput and latency numbers.
+    def __init__(self, baudrate: Optional[int] = BAUDRATE, ingest_latency: float = 0.0,
+                 on_frame: Optional[Callable] = None, history: int = 10000, line_width: int = 2):
+        self.baudrate = baudrate
+        self.ingest_latency = ingest_latency
+        self.on_frame = on_frame
+        self.model = DisplayModel()
+        self.parser = FrameParser(line_width)
+        self.master_fd = -1
+        self.slave_fd = -1
+        self.path = ""
+        self.frames = 0
+        self.bytes = 0
+        self.started = 0.0
+        # (czas odbioru LF, czas wyświetlenia, liczba bajtów)
+        self.timeline: "deque[tuple[float, float, int]]" = deque(maxlen=history)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> str:
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        self.path = os.ttyname(self.slave_fd)
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="mled-emulator", daemon=True)
+        self._thread.start()
+        return self.path
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
+        for fd in (self.master_fd, self.slave_fd):
+            if fd >= 0:
+                os.close(fd)
+        self.master_fd = self.slave_fd = -1
+
+    def _run(self):
+        # czytamy po kawałku nie większym niż to, co łącze przeniesie w ~10 ms
+        chunk = max(1, int(self.baudrate / BITS_PER_BYTE / 100)) if self.baudrate else 4096
+        wire = BITS_PER_BYTE / self.baudrate if self.baudrate else 0.0
+        due = time.monotonic()
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self.master_fd], [], [], 0.1)
+            if not ready:
+                due = time.monotonic()
+                continue
+            try:
+                data = os.read(self.master_fd, chunk)
+            except OSError:
+                return
+            if not data:
+                return
+            if wire:
+                # bajty "docierają" z prędkością łącza
+                due = max(due, time.monotonic()) + len(data) * wire
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            self.bytes += len(data)
+            for line, brightness, payload in self.parser.feed(data):
+                received = time.monotonic()
+                if self.ingest_latency:
+                    time.sleep(self.ingest_latency)
+                applied = time.monotonic()
+                self.model.apply(line, brightness, payload, applied)
+                self.frames += 1
+                self.timeline.append((received, applied, len(payload) + len(line) + 3))
+                if self.on_frame is not None:
+                    self.on_frame(line, brightness, payload, received)
+
+    def stats(self) -> dict:
+        span = max(1e-9, time.monotonic() - self.started)
+        gaps = [b[0] - a[0] for a, b in zip(self.timeline, list(self.timeline)[1:])]
+        return {"frames": self.frames,
+                "bytes": self.bytes,
+                "fps": self.frames / span,
+                "bytes_per_sec": self.bytes / span,
+                "frame_errors": self.parser.errors,
+                "markup_errors": self.model.markup_errors,
+                "max_gap_ms": max(gaps, default=0.0) * 1000.0}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Virtual MLED display on a pty")
+    ap.add_argument("--baud", type=int, default=BAUDRATE, help="simulated link speed, 0 = unlimited")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="device ingest latency per frame")
+    ap.add_argument("--line-width", type=int, choices=LINE_WIDTHS, default=2,
+                    help="line bytes per frame: 2 = Python tools (lines 10-15), 1 = MLED.html")
+    ap.add_argument("--show", action="store_true", help="print the display contents twice a second")
+    args = ap.parse_args(argv)
+    emu = Emulator(args.baud or None, args.latency_ms / 1000.0, line_width=args.line_width)
+    print("MLED emulator on", emu.start(), flush=True)
+    try:
+        while True:
+            time.sleep(0.5)
+            if args.show:
+                lines = emu.model.snapshot()
+                sys.stdout.write("\x1b[H\x1b[J" + "\n".join(f"{k:>2} {v}" for k, v in lines.items()) + "\n")
+                sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(emu.stats())
+        emu.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+"""
+Headless MLED display engine on asyncio.
+Text, scrolling, timers and the countdown finish run as compositor effects
+(mled_compositor), one per line; the Tk GUI (MLED.py) and scripts only call
+the async API.
+"""
+
+import time
+import queue
+import bisect
+import asyncio
+import threading
+from typing import Optional, Iterable, Union
+
+from mled_core import (
+    log, COLOR_MAP, HELLO_PAYLOAD, PRIO_TEXT, CAP_DEVICE_SCROLL,
+    build_frame, FrameTrace, PortPool, TickScheduler, LinkWatchdog,
+)
+from mled_sequence import Step, Timeline, compile_playlist
+from mled_compositor import Compositor, LineEffect, TextEffect, ScrollEffect, CountUpEffect, CountDownEffect
+from mled_pager import Pager, PAGER_DWELL
+
+RAINBOW_CODES = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+# ile czekamy na zejście ramki z portu przy potwierdzeniu
+ACK_TIMEOUT = 2.0
+
+class DisplayEngine:
+    # All state lives on the event loop thread. Serial writes go through the
+    # PortPool writer threads, so nothing on the loop ever blocks on a port.
+    # Text, scroll and timers are compositor effects, one per line: an API
+    # call replaces whatever runs on its line and leaves other lines alone.
+    # line/brightness passed to a call become the current selection, the
+    # same way picking a line in the GUI does.
+    def __init__(self, line: str = "7", brightness: str = "1"):
+        self.line = line
+        self.brightness = brightness
+        self.text_color: Optional[int] = None
+        self.targets: Optional["list[str]"] = None
+        self.pool = PortPool()
+        # ponowne otwieranie portów po zaniku (LinkWatchdog), False = wyłączone
+        self.reconnect = True
+        self.watchdog: Optional[LinkWatchdog] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.ticker: Optional[TickScheduler] = None
+        # efekty linii (mled_compositor), po jednym na linię
+        self.compositor: Optional[Compositor] = None
+        # zdarzenia dla klienta (GUI): ("idle", linia) gdy linia wróciła do spoczynku
+        # (None = wszystkie linie pagera)
+        self.events: "queue.SimpleQueue[tuple[str, object]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._acks: Optional["list[asyncio.Future]"] = None
+        self.trace: Optional[FrameTrace] = None
+
+        # pierwszy kolor następnej tęczy
+        self.rainbow_idx = 0
+
+        # playlista: skompilowana oś czasu, indeks następnej ramki, start (ns)
+        self.seq: Optional[Timeline] = None
+        self.seq_idx = 0
+        self.seq_start_ns = 0
+        self.seq_paused_ns: Optional[int] = None
+        self.seq_job = None
+
+        # wyniki stronami na kilku liniach
+        self.pager: Optional[Pager] = None
+        self.pager_job = None
+
+    @property
+    def connected(self) -> bool:
+        return len(self.pool) > 0
+
+    # ---------- loop ----------
+    def bind_loop(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop or asyncio.get_running_loop()
+        self.ticker = TickScheduler(lambda ms, cb: self.loop.call_later(ms / 1000.0, cb),
+                                    lambda handle: handle.cancel())
+        self.ticker.trace = self.trace
+        self.compositor = Compositor(self.pool, self.ticker, self.send_frame, self._effect_finished)
+        self.compositor.trace = self.trace
+
+    def _ensure_loop(self):
+        if self.loop is None:
+            self.bind_loop()
+
+    def start_background(self):
+        # własna pętla asyncio w wątku w tle (dla GUI)
+        loop = asyncio.new_event_loop()
+        self.bind_loop(loop)
+        self._thread = threading.Thread(target=loop.run_forever, name="mled-engine", daemon=True)
+        self._thread.start()
+
+    def stop_background(self):
+        if self._thread is None:
+            return
+        self.call(self.close()).result(timeout=2.0)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=2.0)
+        self._thread = None
+
+    def call(self, coro):
+        # z innego wątku: uruchom korutynę na pętli silnika
+        fut = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        fut.add_done_callback(_log_failure)
+        return fut
+
+    def call_soon(self, fn, *args):
+        self.loop.call_soon_threadsafe(fn, *args)
+
+    def configure(self, line: Optional[str] = None, brightness: Optional[str] = None,
+                  text_color: Optional[int] = ..., targets: Optional[Iterable[str]] = ...):
+        if line is not None:
+            self.line = line
+        if brightness is not None:
+            self.brightness = brightness
+        if text_color is not ...:
+            self.text_color = text_color
+        if targets is not ...:
+            self.targets = None if targets is None else list(targets)
+
+    def set_trace(self, trace: Optional[FrameTrace]):
+        # ślad ramek dla writerów, puli i schedulera; None wyłącza
+        self.trace = trace
+        self.pool.set_trace(trace)
+        if self.ticker is not None:
+            self.ticker.trace = trace
+            self.compositor.trace = trace
+
+    def set_capture(self, capture):
+        # mled_capture.CaptureWriter albo None; zapis na poziomie PortPool.send
+        self.pool.capture = capture
+
+    async def detach_capture(self):
+        # po powrocie PortPool.send już nie dopisuje, plik można zamknąć z innego wątku
+        self.pool.capture = None
+
+    # ---------- ports ----------
+    async def open(self, names: Iterable[str]) -> "list[tuple[str, str]]":
+        self._ensure_loop()
+        failed = []
+        for name in names:
+            try:
+                await self.loop.run_in_executor(None, self.pool.open, name)
+            except Exception as e:
+                failed.append((name, str(e)))
+        if self.reconnect and self.connected and self.watchdog is None:
+            self.watchdog = LinkWatchdog(self.pool)
+            self.watchdog.start()
+        return failed
+
+    async def close(self):
+        self._stop_pager()
+        if self.watchdog is not None:
+            self.watchdog.stop()
+            self.watchdog = None
+        self._stop_sequence()
+        if self.compositor is not None:
+            self.compositor.stop_all()
+        await self.loop.run_in_executor(None, self.pool.close_all)
+
+    async def hello(self, secs: float = 3.0):
+        # logo MLED po połączeniu, potem pusta linia
+        self._ensure_loop()
+        line, brightness = self.line, self.brightness
+        self.send_frame(build_frame(line, brightness, HELLO_PAYLOAD), line=line, brightness=brightness)
+        self.ticker.once(int(secs * 1000), lambda: self.send_frame(build_frame(line, brightness, ""),
+                                                                   line=line, brightness=brightness), name="hello")
+
+    def send_frame(self, data, coalesce: bool = True, priority: int = PRIO_TEXT,
+                   line: Optional[str] = None, brightness: Optional[str] = None, targets=...) -> int:
+        # linie 10-15 zajmują dwa bajty, więc adres bierzemy z wyboru, nie z ramki
+        line = self.line if line is None else line
+        brightness = self.brightness if brightness is None else brightness
+        on_done = None
+        if self._acks is not None:
+            fut = self.loop.create_future()
+            self._acks.append(fut)
+            on_done = lambda error: self.loop.call_soon_threadsafe(_resolve, fut, error)
+        targets = self.targets if targets is ... else targets
+        return self.pool.send(data, line, brightness, coalesce, priority, targets, on_done)
+
+    async def flushed(self, coro, timeout: float = ACK_TIMEOUT) -> Optional[Exception]:
+        # uruchom wywołanie API i poczekaj, aż wszystkie jego ramki zejdą z portów;
+        # wywołania API nie oddają pętli w trakcie, więc zbieranie jest bezpieczne
+        self._ensure_loop()
+        acks = self._acks = []
+        try:
+            await coro
+        finally:
+            self._acks = None
+        if not acks:
+            return None
+        results = await asyncio.wait_for(asyncio.gather(*acks), timeout)
+        return next((e for e in results if e is not None), None)
+
+    # ---------- API ----------
+    async def send_text(self, text: str, color: Optional[int] = None,
+                        line: Optional[str] = None, brightness: Optional[str] = None):
+        self._ensure_loop()
+        self.configure(line, brightness)
+        self._compose(TextEffect(self.line, self.brightness, text, self._color(color), targets=self.targets))
+
+    async def start_scroll(self, text: str, speed: int = 1, color: Optional[int] = None, rainbow: bool = False,
+                           line: Optional[str] = None, brightness: Optional[str] = None, adaptive: bool = False):
+        self._ensure_loop()
+        self.configure(line, brightness)
+        color = self._color(color)
+        if speed == 0 and not rainbow:
+            self._compose(TextEffect(self.line, self.brightness, text, color, targets=self.targets))
+        elif rainbow:
+            # tęcza od następnego koloru silnika, kolejny po każdym obrocie
+            k = self.rainbow_idx
+            self.rainbow_idx = (k + 1) % len(RAINBOW_CODES)
+            self._compose(ScrollEffect(self.line, self.brightness, text, max(1, speed), targets=self.targets,
+                                       colors=RAINBOW_CODES[k:] + RAINBOW_CODES[:k]))
+        elif adaptive:
+            # start od wybranej prędkości, dalej krok wynika z pomiaru
+            self._compose(ScrollEffect(self.line, self.brightness, text, speed, color, self.targets, adaptive=True))
+        else:
+            # tablice z przewijaniem po swojej stronie dostają jedną ramkę,
+            # host przewija tylko pozostałym
+            device, host = self.pool.split(CAP_DEVICE_SCROLL, self.targets)
+            self._compose(ScrollEffect(self.line, self.brightness, text, speed, color,
+                                       host if device else self.targets, device=device))
+
+    async def stop_scroll(self):
+        if isinstance(self.compositor.get(self.line), ScrollEffect):
+            self.compositor.stop(self.line)
+
+    async def timer_up(self, color: Optional[int] = COLOR_MAP["Green"], on_display: bool = False,
+                       line: Optional[str] = None, brightness: Optional[str] = None):
+        self._ensure_loop()
+        self.configure(line, brightness)
+        self._compose(CountUpEffect(self.line, self.brightness, color, on_display, self.targets))
+
+    async def timer_down(self, seconds: int, color: Optional[int] = None, finish_text: str = "",
+                         finish_secs: int = 5, flash: bool = False,
+                         line: Optional[str] = None, brightness: Optional[str] = None):
+        self._ensure_loop()
+        self.configure(line, brightness)
+        self._compose(CountDownEffect(self.line, self.brightness, seconds, color, finish_text, finish_secs, flash,
+                                      self.targets))
+
+    async def timer_stop(self):
+        # zatrzymanie: wartość z hosta jako statyczny tekst
+        self._ensure_loop()
+        self.compositor.freeze(self.line)
+
+    async def play_sequence(self, playlist: "Union[Timeline, Iterable[Step]]",
+                            line: Optional[str] = None, brightness: Optional[str] = None) -> Timeline:
+        # kroki kompilowane przed startem; podczas odtwarzania tylko wysyłka gotowych ramek
+        self._ensure_loop()
+        self.configure(line, brightness)
+        timeline = playlist if isinstance(playlist, Timeline) else compile_playlist(playlist, self.line, self.brightness)
+        self._stop_sequence()
+        self._take(timeline.line)
+        self.compositor.stop(timeline.line)
+        self.seq = timeline
+        self.seq_idx = 0
+        self.seq_paused_ns = None
+        self.seq_start_ns = time.monotonic_ns()
+        self._seq_step()
+        return timeline
+
+    async def pause_sequence(self):
+        if self.seq is None or self.seq_paused_ns is not None:
+            return
+        self.seq_paused_ns = self._seq_pos()
+        self._cancel_seq_job()
+
+    async def resume_sequence(self):
+        if self.seq is None or self.seq_paused_ns is None:
+            return
+        self.seq_start_ns = time.monotonic_ns() - self.seq_paused_ns
+        self.seq_paused_ns = None
+        self._seq_step()
+
+    async def skip_step(self):
+        # do początku następnego kroku; za ostatnim kroku = koniec
+        if self.seq is None:
+            return
+        pos_ms = self._seq_pos() // 1_000_000
+        nxt = bisect.bisect_right(self.seq.step_starts, pos_ms)
+        if nxt >= len(self.seq.step_starts):
+            self._finish_sequence()
+            return
+        target = self.seq.step_starts[nxt] * 1_000_000
+        self.seq_idx = bisect.bisect_left(self.seq.offsets, self.seq.step_starts[nxt])
+        if self.seq_paused_ns is not None:
+            self.seq_paused_ns = target
+            self._seq_send_due(target)
+        else:
+            self._cancel_seq_job()
+            self.seq_start_ns = time.monotonic_ns() - target
+            self._seq_step()
+
+    async def cancel_sequence(self):
+        if self.seq is not None:
+            self._compose(TextEffect(self.seq.line, self.seq.brightness, "", targets=self.targets))
+
+    async def clear(self, line: Optional[str] = None, brightness: Optional[str] = None):
+        self._ensure_loop()
+        self.configure(line, brightness)
+        self._compose(TextEffect(self.line, self.brightness, "", targets=self.targets))
+
+    # ---------- compositor ----------
+    async def compose(self, effect: LineEffect):
+        # dowolny efekt na dowolnej linii; zastępuje to, co na niej było
+        self._ensure_loop()
+        self._compose(effect)
+
+    async def release_line(self, line: str):
+        self._ensure_loop()
+        self.compositor.stop(line)
+
+    async def freeze_timers(self):
+        self._ensure_loop()
+        self.compositor.freeze()
+
+    def scroll_step_ms(self) -> Optional[int]:
+        # bieżący krok scrolla adaptacyjnego na wybranej linii (GUI), None gdy go nie ma
+        effect = self.compositor.get(self.line) if self.compositor is not None else None
+        return effect.delay_ms if isinstance(effect, ScrollEffect) and effect.adaptive else None
+
+    # ---------- pager ----------
+    async def start_pager(self, pager: Pager, dwell: float = PAGER_DWELL):
+        # linie pagera przestają należeć do efektów kompozytora i playlisty
+        self._ensure_loop()
+        self._stop_pager()
+        for line in pager.lines:
+            self._take(line)
+            self.compositor.stop(line)
+        self.pager = pager
+        if self._pager_step():
+            ms = int(dwell * 1000)
+            self.pager_job = self.ticker.every(ms, self._pager_step, name="pager", first_ms=ms)
+
+    async def stop_pager(self):
+        self._stop_pager()
+
+    # ---------- internals ----------
+    def _color(self, color: Optional[int]) -> Optional[int]:
+        return self.text_color if color is None else color
+
+    def _take(self, line: str):
+        # linia przejęta przez wywołanie API: playlista i pager już jej nie nadpiszą
+        if self.seq is not None and self.seq.line == line:
+            self._stop_sequence()
+        self._release_pager(line)
+
+    def _compose(self, effect: LineEffect):
+        self._take(effect.line)
+        self.compositor.set(effect)
+
+    def _effect_finished(self, effect: LineEffect):
+        # odliczanie (z tekstem końcowym) albo tekst na czas zszedł z linii
+        self.events.put(("idle", effect.line))
+
+    # ---------- sequence ----------
+    def _seq_pos(self) -> int:
+        if self.seq_paused_ns is not None:
+            return self.seq_paused_ns
+        return time.monotonic_ns() - self.seq_start_ns
+
+    def _seq_send_due(self, pos_ns: int):
+        # wysyła ostatnią należną ramkę; spóźnione wcześniejsze są pomijane
+        tl = self.seq
+        pos_ms = pos_ns // 1_000_000
+        idx, last = self.seq_idx, None
+        while idx < len(tl) and tl.offsets[idx] <= pos_ms:
+            last = idx
+            idx += 1
+        self.seq_idx = idx
+        if last is not None:
+            self.send_frame(tl.frames[last], priority=tl.prios[last], line=tl.line, brightness=tl.brightness)
+
+    def _seq_step(self):
+        self.seq_job = None
+        if self.seq is None or self.seq_paused_ns is not None:
+            return
+        pos = self._seq_pos()
+        self._seq_send_due(pos)
+        tl = self.seq
+        nxt_ms = tl.offsets[self.seq_idx] if self.seq_idx < len(tl) else tl.duration_ms
+        if self.seq_idx >= len(tl) and pos >= tl.duration_ms * 1_000_000:
+            self._finish_sequence()
+            return
+        delay_ms = max(0, -(-(nxt_ms * 1_000_000 - pos) // 1_000_000))
+        self.seq_job = self.ticker.once(delay_ms, self._seq_step, name="sequence")
+
+    def _finish_sequence(self):
+        line = self.seq.line
+        self._stop_sequence()
+        self.events.put(("idle", line))
+
+    def _cancel_seq_job(self):
+        if self.seq_job is not None:
+            self.ticker.cancel(self.seq_job)
+            self.seq_job = None
+
+    def _stop_sequence(self):
+        self._cancel_seq_job()
+        self.seq = None
+        self.seq_idx = 0
+        self.seq_paused_ns = None
+
+    def _pager_step(self) -> bool:
+        changes = self.pager.changes() if self.pager is not None else None
+        if changes is None:
+            self._stop_pager()
+            self.events.put(("idle", None))
+            return False
+        with self.pool.batch():
+            for line, frame in changes:
+                self.send_frame(frame, line=line, brightness=self.pager.brightness)
+        return True
+
+    def _release_pager(self, line: str):
+        # linia przejęta przez inne wywołanie: pager nie może jej nadpisać następną stroną
+        if self.pager is not None and line in self.pager.lines:
+            self._stop_pager()
+
+    def _stop_pager(self):
+        if self.pager_job is not None:
+            self.ticker.cancel(self.pager_job)
+            self.pager_job = None
+        self.pager = None
+
+def _resolve(fut: asyncio.Future, error: Optional[Exception]):
+    if not fut.done():
+        fut.set_result(error)
+
+def _log_failure(fut):
+    if not fut.cancelled() and fut.exception() is not None:
+        log.error("engine call failed", exc_info=fut.exception())
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+MLED results pager: ranked rows (start number, name, time) spread over a
+set of lines, one page per dwell period. Rows are read lazily from a CSV
+or any iterable; each page is encoded once, one page ahead, and a page
+change sends only the lines that differ from what is shown.
+"""
+
+import csv
+from typing import Optional, Iterable, Iterator, Sequence, Union
+
+from mled_core import MAX_PAYLOAD, build_frame, markup, markup_overhead, sanitize
+
+# ile stron trzymamy zakodowanych do zapętlenia; dłuższe listy czytane od nowa z pliku
+PAGE_CACHE = 256
+PAGER_DWELL = 5.0
+
+def read_rows(path: str, delimiter: Optional[str] = None, header: bool = False,
+              encoding: str = "utf-8-sig") -> Iterator["list[str]"]:
+    # wiersz po wierszu, pamięć nie rośnie z rozmiarem pliku; separator , ; lub tab zgadywany
+    with open(path, newline="", encoding=encoding) as f:
+        if delimiter is None:
+            sample = f.read(2048)
+            f.seek(0)
+            try:
+                delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t").delimiter
+            except csv.Error:
+                delimiter = ","
+        reader = csv.reader(f, delimiter=delimiter)
+        if header:
+            next(reader, None)
+        for row in reader:
+            fields = [c.strip() for c in row]
+            if any(fields):
+                yield fields
+
+def format_row(fields: Sequence[str], width: int = 0, color: Optional[int] = None,
+               time_color: Optional[int] = None) -> str:
+    # "12 Kowalski Jan 01:23.45": ostatnie pole (czas) w osobnym kolorze;
+    # obcinana jest zawsze nazwa, nigdy czas; z width czas dosunięty do prawej
+    fields = [sanitize(f) for f in fields if f]
+    if not fields:
+        return ""
+    if len(fields) == 1:
+        return markup(((fields[0], color),))
+    head, tail = " ".join(fields[:-1]), fields[-1]
+    # miejsce na widoczny tekst po odjęciu znaczników koloru
+    visible = MAX_PAYLOAD - markup_overhead(color) - markup_overhead(time_color)
+    if width:
+        visible = min(visible, width)
+    tail = tail[:visible]
+    room = max(0, visible - len(tail) - 1)
+    head = head[:room].ljust(room) if width else head[:room]
+    if not head:
+        return markup(((tail, time_color),))
+    return markup(((head + " ", color), (tail, time_color)))
+
+class Pager:
+    # Pages of len(lines) rows. changes() returns the (line, frame) pairs of
+    # the page prepared on the previous call that differ from the display,
+    # then encodes the next page. A list that fits in PAGE_CACHE pages loops
+    # from memory; a longer file is read again from the start.
+    def __init__(self, source: Union[str, Iterable[Sequence[str]]], lines: Sequence[str], brightness: str = "1",
+                 width: int = 0, color: Optional[int] = None, time_color: Optional[int] = None,
+                 header: bool = False, delimiter: Optional[str] = None):
+        self.lines = list(lines)
+        self.brightness = brightness
+        self.width = width
+        self.color = color
+        self.time_color = time_color
+        self._reopen = (lambda: read_rows(source, delimiter, header)) if isinstance(source, str) else None
+        self._stream = self._pages(self._reopen() if self._reopen is not None else iter(source))
+        self._cache: Optional["list[tuple[bytes, ...]]"] = []
+        self._looping = False
+        self._pos = 0
+        self._next: Optional["tuple[bytes, ...]"] = None
+        self._started = False
+        # co jest teraz na tablicy, linia -> ramka
+        self.shown: "dict[str, bytes]" = {}
+        self.pages_encoded = 0
+        self.pages_shown = 0
+        self._blank = {line: build_frame(line, brightness, "") for line in self.lines}
+
+    def _encode(self, rows: "list[Sequence[str]]") -> "tuple[bytes, ...]":
+        self.pages_encoded += 1
+        frames = [build_frame(line, self.brightness, format_row(row, self.width, self.color, self.time_color))
+                  for line, row in zip(self.lines, rows)]
+        return tuple(frames) + tuple(self._blank[line] for line in self.lines[len(frames):])
+
+    def _pages(self, rows: Iterable[Sequence[str]]) -> Iterator["tuple[bytes, ...]"]:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == len(self.lines):
+                yield self._encode(chunk)
+                chunk = []
+        if chunk:
+            yield self._encode(chunk)
+
+    def _next_page(self) -> Optional["tuple[bytes, ...]"]:
+        if self._looping:
+            page = self._cache[self._pos % len(self._cache)]
+            self._pos += 1
+            return page
+        page = next(self._stream, None)
+        if page is not None:
+            if self._cache is not None:
+                self._cache.append(page)
+                if len(self._cache) > PAGE_CACHE:
+                    self._cache = None
+            return page
+        if self._cache:
+            # cała lista w pamięci: dalej już bez czytania i kodowania
+            self._looping = True
+            self._pos = 1
+            return self._cache[0]
+        if self._reopen is not None:
+            self._stream = self._pages(self._reopen())
+            return next(self._stream, None)
+        return None
+
+    def changes(self) -> "Optional[list[tuple[str, bytes]]]":
+        # None = koniec (pusta lista albo jednorazowe źródło za długie do zapętlenia)
+        if not self._started:
+            self._started = True
+            self._next = self._next_page()
+        page = self._next
+        if page is None:
+            return None
+        out = [(line, frame) for line, frame in zip(self.lines, page) if self.shown.get(line) != frame]
+        for line, frame in out:
+            self.shown[line] = frame
+        self.pages_shown += 1
+        self._next = self._next_page()
+        return out
+
+def parse_lines(spec: str) -> "list[str]":
+    # "3-8" albo "3,5,7" (albo oba: "1-3,7")
+    lines = []
+    for part in spec.split(","):
+        a, _, b = part.strip().partition("-")
+        lines.extend(str(n) for n in range(int(a), int(b or a) + 1))
+    if not lines or any(not 1 <= int(n) <= 15 for n in lines):
+        raise ValueError("lines must be within 1-15")
+    return lines
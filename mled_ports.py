@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MLED port discovery: background enumeration with a cached device list
+python3 mled_ports.py [--probe] [--line 15]
+
+comports() runs on a worker thread; the GUI reads the cache and gets only
+the changes. The optional probe opens a port, sends the ^ic hello frame and
+ranks the ports that took it (and any that answered) first.
+"""
+
+import sys
+import time
+import queue
+import argparse
+import threading
+from typing import Optional, Callable
+
+import serial
+import serial.tools.list_ports
+
+from mled_core import (
+    log, BAUDRATE, BYTESIZE, PARITY, STOPBITS, HELLO_PAYLOAD, LINE_CHOICES, build_frame,
+)
+
+# co ile sekund lista portów jest odświeżana
+SCAN_SECS = 2.0
+PROBE_TIMEOUT = 0.5
+# czas na ewentualną odpowiedź tablicy po ramce ^ic
+PROBE_LISTEN = 0.3
+PROBE_LINE = "15"
+# typowe mostki USB-RS232/485 w tablicach: FTDI, Prolific, WCH CH340, Silabs CP210x
+USB_SERIAL_VIDS = {0x0403: "FTDI", 0x067B: "Prolific", 0x1A86: "WCH", 0x10C4: "Silicon Labs"}
+UNLIKELY = ("bluetooth", "rfcomm", "modem", "debug-console", "wlan")
+
+class PortInfo:
+    # One enumerated port; score orders the list (higher = more likely a board).
+    __slots__ = ("device", "description", "vid", "pid", "serial_number", "manufacturer",
+                 "probe", "last_used")
+
+    def __init__(self, device: str, description: str = "", vid: Optional[int] = None, pid: Optional[int] = None,
+                 serial_number: Optional[str] = None, manufacturer: Optional[str] = None):
+        self.device = device
+        self.description = description
+        self.vid = vid
+        self.pid = pid
+        self.serial_number = serial_number
+        self.manufacturer = manufacturer
+        # None = nie sondowano, "ok", "answered" albo treść błędu
+        self.probe: Optional[str] = None
+        self.last_used = 0.0
+
+    @property
+    def key(self) -> tuple:
+        return (self.device, self.vid, self.pid, self.serial_number, self.description)
+
+    @property
+    def unlikely(self) -> bool:
+        text = f"{self.device} {self.description}".lower()
+        return any(word in text for word in UNLIKELY)
+
+    @property
+    def score(self) -> int:
+        score = 0
+        if self.vid in USB_SERIAL_VIDS:
+            score += 2
+        elif self.vid is not None:
+            score += 1
+        if self.unlikely:
+            score -= 3
+        if self.probe == "answered":
+            score += 6
+        elif self.probe == "ok":
+            score += 3
+        elif self.probe is not None:
+            score -= 2
+        if self.last_used:
+            score += 4
+        return score
+
+    def label(self) -> str:
+        ids = f" [{self.vid:04X}:{self.pid:04X}]" if self.vid is not None and self.pid is not None else ""
+        sn = f" SN {self.serial_number}" if self.serial_number else ""
+        probe = f" · {self.probe}" if self.probe else ""
+        return f"{self.device}  {self.description}{ids}{sn}{probe}"
+
+def list_ports() -> "list[PortInfo]":
+    return [PortInfo(p.device, p.description or "", p.vid, p.pid, p.serial_number, p.manufacturer)
+            for p in serial.tools.list_ports.comports()]
+
+def probe_port(device: str, line: str = PROBE_LINE) -> str:
+    # "answered" gdy coś wróciło, "ok" gdy ramka zeszła; wyjątek = port zajęty albo martwy
+    with serial.serial_for_url(device, baudrate=BAUDRATE, bytesize=BYTESIZE, parity=PARITY,
+                               stopbits=STOPBITS, timeout=PROBE_LISTEN, write_timeout=PROBE_TIMEOUT) as port:
+        port.reset_input_buffer()
+        port.write(build_frame(line, "1", HELLO_PAYLOAD))
+        port.flush()
+        answer = port.read(64)
+        port.write(build_frame(line, "1", ""))
+        port.flush()
+    return "answered" if answer else "ok"
+
+class PortScanner(threading.Thread):
+    # Keeps self.ports in sync with comports() off the UI thread. Every
+    # change goes to self.changes as (added, removed) device names;
+    # exclude() names ports that must not be probed (already open).
+    def __init__(self, interval: float = SCAN_SECS, exclude: Optional[Callable] = None):
+        super().__init__(name="mled-ports", daemon=True)
+        self.interval = interval
+        self.exclude = exclude
+        self.ports: "dict[str, PortInfo]" = {}
+        self.changes: "queue.SimpleQueue[tuple[list[str], list[str]]]" = queue.SimpleQueue()
+        self.scans = 0
+        self.scan_ms = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._probe = threading.Event()
+        self._halt = threading.Event()
+
+    def ranked(self) -> "list[PortInfo]":
+        with self._lock:
+            ports = list(self.ports.values())
+        return sorted(ports, key=lambda p: (-p.score, p.device))
+
+    def best(self) -> Optional[PortInfo]:
+        ranked = self.ranked()
+        return ranked[0] if ranked and ranked[0].score > 0 else None
+
+    def refresh(self):
+        self._wake.set()
+
+    def request_probe(self):
+        self._probe.set()
+        self._wake.set()
+
+    def mark_used(self, devices):
+        # porty, które się otworzyły, idą na górę listy
+        now = time.monotonic()
+        with self._lock:
+            for dev in devices:
+                if dev in self.ports:
+                    self.ports[dev].last_used = now
+        self.changes.put(([], []))
+
+    def run(self):
+        while not self._halt.is_set():
+            try:
+                self._scan()
+                if self._probe.is_set():
+                    self._probe.clear()
+                    self._probe_all()
+            except Exception:
+                log.exception("port scan failed")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _scan(self):
+        t0 = time.perf_counter()
+        found = {p.device: p for p in list_ports()}
+        self.scan_ms = (time.perf_counter() - t0) * 1000.0
+        self.scans += 1
+        with self._lock:
+            added = [d for d in found if d not in self.ports or self.ports[d].key != found[d].key]
+            removed = [d for d in self.ports if d not in found]
+            for dev in removed:
+                del self.ports[dev]
+            for dev in added:
+                # wynik sondy i ostatnie użycie zostają przy tym samym urządzeniu
+                old = self.ports.get(dev)
+                if old is not None:
+                    found[dev].probe, found[dev].last_used = old.probe, old.last_used
+                self.ports[dev] = found[dev]
+        if added or removed:
+            self.changes.put((added, removed))
+
+    def _probe_all(self):
+        busy = set(self.exclude() if self.exclude is not None else ())
+        for info in self.ranked():
+            if info.device in busy or info.unlikely or self._halt.is_set():
+                continue
+            try:
+                info.probe = probe_port(info.device)
+            except (serial.SerialException, OSError, ValueError) as e:
+                info.probe = str(e).splitlines()[0][:60] or type(e).__name__
+            self.changes.put(([info.device], []))
+
+    def stop(self):
+        self._halt.set()
+        self._wake.set()
+        if self.is_alive():
+            self.join(1.0)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="List serial ports, most likely MLED boards first")
+    ap.add_argument("--probe", action="store_true", help="send the ^ic hello frame to every free port")
+    ap.add_argument("--line", default=PROBE_LINE, choices=LINE_CHOICES, help="line used by the probe frame")
+    args = ap.parse_args(argv)
+    t0 = time.perf_counter()
+    ports = list_ports()
+    scan_ms = (time.perf_counter() - t0) * 1000.0
+    for info in ports:
+        if args.probe and not info.unlikely:
+            try:
+                info.probe = probe_port(info.device, args.line)
+            except (serial.SerialException, OSError, ValueError) as e:
+                info.probe = str(e).splitlines()[0][:60] or type(e).__name__
+    for info in sorted(ports, key=lambda p: (-p.score, p.device)):
+        print(f"{info.score:+d}  {info.label()}")
+    print(f"{len(ports)} ports, scan {scan_ms:.1f} ms", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
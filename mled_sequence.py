@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+MLED playlists: steps compiled ahead of time into a timeline of ready frames.
+The engine plays a Timeline on the monotonic clock (DisplayEngine.play_sequence);
+nothing is formatted or encoded while it plays.
+"""
+
+from typing import Optional, Iterable
+
+from mled_core import (
+    PRIO_TIMER, PRIO_TEXT, PRIO_SCROLL, SCROLL_DELAYS,
+    build_frame, wrap_color, markup, plain_frame, sanitize, ScrollRing,
+)
+
+# kolory coursewalku jak w wersji web (mixColor/dualColor)
+CW_LABEL_COLOR = 3
+CW_SOON_COLOR = 2
+CW_COUNT_COLOR = 9
+CW_END_COLOR = 1
+
+class Step:
+    # One playlist entry; kind is text, scroll, countdown or hold.
+    # markup=True sends text as a ready payload (colors already inside).
+    __slots__ = ("kind", "secs", "text", "color", "speed", "label", "label_color", "markup")
+
+    def __init__(self, kind: str, secs: float, text: str = "", color: Optional[int] = None, speed: int = 1,
+                 label: str = "", label_color: Optional[int] = None, markup: bool = False):
+        if kind not in ("text", "scroll", "countdown", "hold"):
+            raise ValueError(f"Unknown step {kind}")
+        self.kind = kind
+        self.secs = secs
+        self.text = text
+        self.color = color
+        self.speed = speed
+        self.label = label
+        self.label_color = label_color
+        self.markup = markup
+
+def text_step(text: str, secs: float, color: Optional[int] = None, markup: bool = False) -> Step:
+    return Step("text", secs, text, color, markup=markup)
+
+def scroll_step(text: str, secs: float, speed: int = 1, color: Optional[int] = None) -> Step:
+    return Step("scroll", secs, text, color, speed)
+
+def countdown_step(secs: int, label: str = "", color: Optional[int] = CW_COUNT_COLOR,
+                   label_color: Optional[int] = CW_LABEL_COLOR) -> Step:
+    return Step("countdown", secs, color=color, label=label, label_color=label_color)
+
+def hold_step(secs: float) -> Step:
+    return Step("hold", secs)
+
+def dual_color(left: str, left_code: Optional[int], right: str, right_code: Optional[int]) -> str:
+    return markup(((left, left_code), (" ", None), (right, right_code)))
+
+def fmt_mss(total: int) -> str:
+    return f"{total // 60}:{total % 60:02d}"
+
+def coursewalk(count: int, minutes: float, wait_secs: int = 20) -> "list[Step]":
+    # jak runCoursewalk w MLED.html: "i/n soon", odliczanie co sekundę, "i/n END"
+    steps = []
+    for i in range(1, count + 1):
+        label = f"{i}/{count}"
+        steps.append(text_step(dual_color(label, CW_LABEL_COLOR, "soon", CW_SOON_COLOR), wait_secs, markup=True))
+        steps.append(countdown_step(int(minutes * 60), label))
+        steps.append(text_step(dual_color(label, CW_LABEL_COLOR, "END", CW_END_COLOR), wait_secs, markup=True))
+    return steps
+
+class Timeline:
+    # Frames with their offsets (ms from start), sorted; step_starts[i] is
+    # the offset of step i, used by skip.
+    __slots__ = ("line", "brightness", "offsets", "frames", "prios", "step_starts", "duration_ms")
+
+    def __init__(self, line: str, brightness: str):
+        self.line = line
+        self.brightness = brightness
+        self.offsets: "list[int]" = []
+        self.frames: "list[bytes]" = []
+        self.prios: "list[int]" = []
+        self.step_starts: "list[int]" = []
+        self.duration_ms = 0
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def add(self, offset_ms: int, frame: bytes, priority: int):
+        self.offsets.append(offset_ms)
+        self.frames.append(frame)
+        self.prios.append(priority)
+
+def compile_playlist(steps: Iterable[Step], line: str, brightness: str) -> Timeline:
+    # wszystkie ramki liczone tutaj; błędy (za długi tekst) wychodzą przed startem
+    tl = Timeline(line, brightness)
+    t = 0
+    for step in steps:
+        tl.step_starts.append(t)
+        dur = int(step.secs * 1000)
+        if step.kind == "text":
+            if step.markup:
+                tl.add(t, build_frame(line, brightness, step.text), PRIO_TEXT)
+            else:
+                tl.add(t, plain_frame(line, brightness, sanitize(step.text), step.color), PRIO_TEXT)
+        elif step.kind == "scroll":
+            ring = ScrollRing(sanitize(step.text)[:64] + "   ", plain_frame)
+            ring.build(line, brightness, [step.color])
+            frames = ring.frames[step.color]
+            delay = SCROLL_DELAYS.get(step.speed, SCROLL_DELAYS[1])
+            for k, off in enumerate(range(0, max(dur, 1), delay)):
+                tl.add(t + off, frames[k % len(frames)], PRIO_SCROLL)
+        elif step.kind == "countdown":
+            total = int(step.secs)
+            label = sanitize(step.label)
+            for k in range(total, 0, -1):
+                num = fmt_mss(k)
+                payload = dual_color(label, step.label_color, num, step.color) if label else wrap_color(num, step.color)
+                tl.add(t + (total - k) * 1000, build_frame(line, brightness, payload), PRIO_TIMER)
+        t += dur
+    tl.duration_ms = t
+    return tl
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MLED control server: TCP and UDP front-end for the display engine
+python3 mled_server.py --port COM3 [--tcp 127.0.0.1:4001] [--udp 127.0.0.1:4002] [--device-scroll]
+
+One command per line (UTF-8). TCP replies "OK" once the frame has been
+written and flushed to every board, or "ERR <reason>". UDP never replies.
+Lines are independent: a scroll on one line keeps running while another
+counts.
+
+  TEXT  <line> [color=Red] [bright=2] <text>    (text kept as sent, spaces included)
+  SCROLL <line> [speed=0-3|auto] [color=..] [rainbow=1] <text>
+  UP    <line> [color=..] [device=1]
+  DOWN  <line> <mm:ss> [color=..] [secs=5] [flash=1] [finish text]
+  STOP
+  CLEAR <line>
+  PING
+
+Local test: --port loop:// and `nc 127.0.0.1 4001`.
+"""
+
+import re
+import sys
+import asyncio
+import logging
+import argparse
+from typing import Optional
+
+from mled_core import (
+    log, LINE_CHOICES, BRIGHTNESS_CHOICES, COLOR_MAP, CAP_DEVICE_SCROLL, SCROLL_DELAYS, parse_color,
+)
+from mled_engine import DisplayEngine
+from mled_compositor import TextEffect, ScrollEffect, CountUpEffect, CountDownEffect
+
+DEFAULT_TCP = "127.0.0.1:4001"
+LINE_VERBS = ("TEXT", "SCROLL", "UP", "DOWN", "CLEAR")
+MAX_LINE_BYTES = 1024
+# słowo albo opcja key=value (wartość ze spacjami w cudzysłowie) i jeden separator;
+# reszta linii to tekst, przekazywany bez zmian (apostrofy, wielokrotne spacje)
+WORD_RE = re.compile(r"\s*(\S+)\s?")
+OPTION_RE = re.compile(r'\s*(\w+)=("[^"]*"|\S*)\s?')
+
+class CommandError(ValueError):
+    pass
+
+def _color(value: str) -> Optional[int]:
+    try:
+        return parse_color(value)
+    except ValueError as e:
+        raise CommandError(str(e)) from None
+
+def _flag(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes", "on")
+
+def _int(value: str, name: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise CommandError(f"{name} must be a number") from None
+
+def _mmss(value: str) -> int:
+    mm, _, ss = value.partition(":")
+    if not ss:
+        mm, ss = "0", mm
+    return _int(mm, "minutes") * 60 + _int(ss, "seconds")
+
+def _word(rest: str) -> "tuple[Optional[str], str]":
+    m = WORD_RE.match(rest)
+    return (m.group(1), rest[m.end():]) if m else (None, rest)
+
+def _options(rest: str, opts: dict) -> str:
+    while True:
+        m = OPTION_RE.match(rest)
+        if not m:
+            return rest
+        opts[m.group(1).lower()] = m.group(2).strip('"')
+        rest = rest[m.end():]
+
+def parse_command(engine: DisplayEngine, text: str):
+    # zwraca korutynę API silnika (albo None dla PING)
+    verb, rest = _word(text)
+    if verb is None:
+        raise CommandError("empty command")
+    verb = verb.upper()
+    if verb == "PING":
+        return None
+    if verb == "STOP":
+        return _stop_timers(engine)
+    if verb not in LINE_VERBS:
+        raise CommandError(f"unknown command {verb}")
+
+    line, rest = _word(rest)
+    if line not in LINE_CHOICES:
+        raise CommandError("line must be 1-15")
+    opts = {}
+    rest = _options(rest, opts)
+    clock = None
+    if verb == "DOWN":
+        # opcje przed albo za czasem
+        clock, rest = _word(rest)
+        rest = _options(rest, opts)
+    # bez bright= zawsze 1, żeby wynik nie zależał od poprzedniego klienta
+    bright = opts.pop("bright", "1")
+    if bright not in BRIGHTNESS_CHOICES:
+        raise CommandError("bright must be 1 2 or 3")
+    color = _color(opts.pop("color")) if "color" in opts else None
+    where = {"line": line, "brightness": bright}
+
+    if verb == "TEXT":
+        cmd = engine.compose(TextEffect(line, bright, rest, color))
+    elif verb == "SCROLL":
+        speed = opts.pop("speed", "1")
+        adaptive = speed.lower() == "auto"
+        speed = 3 if adaptive else _int(speed, "speed")
+        if speed != 0 and speed not in SCROLL_DELAYS:
+            raise CommandError("speed must be 0-3 or auto")
+        rainbow = _flag(opts.pop("rainbow", "0"))
+        if speed == 0 and not rainbow:
+            cmd = engine.compose(TextEffect(line, bright, rest, color))
+        elif rainbow or adaptive:
+            cmd = engine.start_scroll(rest, speed, color, rainbow, **where, adaptive=adaptive)
+        else:
+            # tablice z ^sc przewijają same, host tylko pozostałym
+            device, host = engine.pool.split(CAP_DEVICE_SCROLL)
+            cmd = engine.compose(ScrollEffect(line, bright, rest, speed, color,
+                                              host if device else None, device=device))
+    elif verb == "UP":
+        cmd = engine.compose(CountUpEffect(line, bright, COLOR_MAP["Green"] if color is None else color,
+                                           _flag(opts.pop("device", "0"))))
+    elif verb == "DOWN":
+        if clock is None:
+            raise CommandError("DOWN needs mm:ss")
+        cmd = engine.compose(CountDownEffect(line, bright, _mmss(clock), color, rest,
+                                             _int(opts.pop("secs", "5"), "secs"), _flag(opts.pop("flash", "0"))))
+    else:
+        cmd = engine.compose(TextEffect(line, bright, ""))
+    if opts:
+        cmd.close()
+        raise CommandError("unknown option " + ", ".join(opts))
+    return cmd
+
+async def _stop_timers(engine: DisplayEngine):
+    await engine.freeze_timers()
+
+class ControlServer:
+    # Listeners share the engine's event loop; a command only queues frames on
+    # the writer threads, so a slow board never stalls other clients.
+    def __init__(self, engine: DisplayEngine):
+        self.engine = engine
+        self.servers = []
+        self.transports = []
+        self.clients = 0
+
+    async def execute(self, text: str, ack: bool = True) -> str:
+        try:
+            cmd = parse_command(self.engine, text)
+        except CommandError as e:
+            return f"ERR {e}"
+        if cmd is None:
+            return "OK"
+        try:
+            if not ack:
+                await cmd
+                return "OK"
+            error = await self.engine.flushed(cmd)
+        except asyncio.TimeoutError:
+            return "ERR timeout"
+        except Exception as e:
+            log.exception("command failed: %s", text)
+            return f"ERR {e}"
+        return "OK" if error is None else f"ERR {error}"
+
+    async def start_tcp(self, host: str, port: int):
+        server = await asyncio.start_server(self._handle_client, host, port, limit=MAX_LINE_BYTES)
+        self.servers.append(server)
+        log.info("TCP control on %s:%d", host, port)
+        return server
+
+    async def start_udp(self, host: str, port: int):
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(lambda: _UdpProtocol(self), local_addr=(host, port))
+        self.transports.append(transport)
+        log.info("UDP control on %s:%d", host, port)
+        return transport
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername")
+        self.clients += 1
+        try:
+            while True:
+                try:
+                    raw = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    writer.write(b"ERR line too long\n")
+                    break
+                if not raw:
+                    break
+                text = raw.decode("utf-8", "replace").rstrip("\r\n")
+                if not text.strip():
+                    continue
+                reply = await self.execute(text)
+                writer.write(reply.encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients -= 1
+            log.debug("client %s gone", peer)
+            writer.close()
+
+    async def close(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        for transport in self.transports:
+            transport.close()
+        self.servers.clear()
+        self.transports.clear()
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+    # fire-and-forget: każda linia datagramu to komenda, bez odpowiedzi
+    def __init__(self, server: ControlServer):
+        self.server = server
+
+    def datagram_received(self, data: bytes, addr):
+        for raw in data.decode("utf-8", "replace").splitlines():
+            if raw.strip():
+                task = asyncio.ensure_future(self.server.execute(raw, ack=False))
+                task.add_done_callback(lambda t, addr=addr: _log_udp(t, addr))
+
+def _log_udp(task: asyncio.Task, addr):
+    if not task.cancelled() and task.result().startswith("ERR"):
+        log.warning("udp %s: %s", addr, task.result())
+
+def _host_port(value: str):
+    host, _, port = value.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+async def serve(args):
+    engine = DisplayEngine()
+    engine.bind_loop()
+    failed = await engine.open(p.strip() for p in args.port.split(",") if p.strip())
+    for name, err in failed:
+        log.error("%s: %s", name, err)
+    if not engine.connected:
+        sys.exit("no port opened")
+    engine.pool.set_cap(CAP_DEVICE_SCROLL, args.device_scroll)
+    server = ControlServer(engine)
+    await server.start_tcp(*_host_port(args.tcp))
+    if args.udp:
+        await server.start_udp(*_host_port(args.udp))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+        await engine.close()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="MLED TCP/UDP control server")
+    ap.add_argument("--port", required=True, help="serial port(s), comma separated (loop:// for testing)")
+    ap.add_argument("--tcp", default=DEFAULT_TCP, help="host:port for line commands with ack")
+    ap.add_argument("--udp", help="host:port for fire-and-forget commands")
+    ap.add_argument("--device-scroll", action="store_true", help="boards scroll text themselves (^sc)")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()